@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Análise das mensagens (filtro de palavras e impressão digital), opcionalmente em um pool de processos
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from deduplicacao import ImpressaoMensagem, gerar_impressao
+from filtro_palavras import FiltroPalavras
+
+# (palavras_chave, palavras_bloqueadas, palavra_inteira, ignorar_acentos)
+RegrasFiltro = tuple[tuple[str, ...], tuple[str, ...], bool, bool]
+
+@lru_cache(maxsize=64)
+def _filtro(regras: RegrasFiltro) -> FiltroPalavras:
+    # Cada processo do pool compila um conjunto de regras uma vez só (um reload gera um conjunto novo)
+    palavras_chave, palavras_bloqueadas, palavra_inteira, ignorar_acentos = regras
+    return FiltroPalavras(list(palavras_chave), list(palavras_bloqueadas), palavra_inteira, ignorar_acentos)
+
+def _aprovada(regras: RegrasFiltro, tem_chave: bool, bloqueada: bool) -> bool:
+    return (tem_chave or not regras[0]) and not bloqueada
+
+def analisar(texto: str, regras: list[RegrasFiltro], media: Optional[str],
+             com_impressao: bool) -> tuple[list[tuple[bool, bool]], Optional[ImpressaoMensagem]]:
+    """(tem_chave, bloqueada) por destino e a impressão digital, só calculada se algum destino aprovou."""
+    analises = [_filtro(r).analisar(texto) for r in regras]
+    aprovada = any(_aprovada(r, *a) for r, a in zip(regras, analises))
+    return analises, (gerar_impressao(texto, media) if com_impressao and aprovada else None)
+
+class AnalisadorMensagens:
+    """Com `processos` > 0 a análise roda em um ProcessPoolExecutor, fora do loop do Telethon.
+
+    Cada chamada paga a cópia do texto e das regras para o processo, então o pool só compensa com
+    listas de palavras grandes e textos longos; com 0 a análise usa os filtros já compilados do destino.
+    """
+    def __init__(self, processos: int = 0):
+        self.processos = processos
+        self._pool = ProcessPoolExecutor(processos, mp_context=multiprocessing.get_context('spawn')) if processos > 0 else None
+
+    async def analisar(self, texto: str, destinos: list, media: Optional[str],
+                       com_impressao: bool) -> tuple[list[tuple[bool, bool]], Optional[ImpressaoMensagem]]:
+        if self._pool is None:
+            analises = [d.filtro.analisar(texto) for d in destinos]
+            aprovada = any(_aprovada(d.regras_filtro, *a) for d, a in zip(destinos, analises))
+            return analises, (gerar_impressao(texto, media) if com_impressao and aprovada else None)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, analisar, texto, [d.regras_filtro for d in destinos], media, com_impressao)
+
+    def fechar(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do bot contra um servidor Shopee falso local (sem rede externa)
+
+Uso:
+    python benchmark_bot.py --mensagens 50 --links 3 --latencia 0.2
+"""
+
+import os
+import argparse
+import asyncio
+import threading
+import time
+import json
+import re
+import random
+
+# Valores fictícios para montar o bot sem um .env real
+for _var, _valor in {'API_ID': '1', 'API_HASH': 'benchmark', 'CANAL_ORIGEM': '@origem',
+                     'CANAL_DESTINO': '@destino', 'SHOPEE_APP_ID': 'app', 'SHOPEE_SECRET': 'secret',
+                     'CACHE_LINKS_ARQUIVO': '', 'FILA_ARQUIVO': '', 'MAPEAMENTO_ARQUIVO': ''}.items():
+    os.environ.setdefault(_var, _valor)
+
+import requests
+from aiohttp import web
+
+import bot_cupons
+from bot_cupons import ShopeeAPI, AgrupadorLinks, fechar_sessao_http
+from filtro_palavras import FiltroPalavras
+from links_shopee import extrair_links_shopee
+from limitador import LimitadorTaxa, DisjuntorCircuito, estatisticas as estatisticas_limitador
+from cache_links import CacheLinks
+from metricas import configurar_logs
+
+class ServidorShopeeFalso:
+    """Servidor HTTP local que imita o endpoint GraphQL e os shortlinks da Shopee.
+
+    `roteiro` força as próximas respostas GraphQL, uma por requisição ('429', '10030' ou '500'),
+    antes dos erros sorteados, e '503' faz o próximo shortlink falhar; URLs com "invalido" recebem
+    um erro GraphQL definitivo.
+    """
+    def __init__(self, latencia: float = 0.2, taxa_429: float = 0.0, taxa_throttling: float = 0.0, taxa_erro: float = 0.0):
+        self.latencia = latencia
+        self.taxa_429 = taxa_429
+        self.taxa_throttling = taxa_throttling
+        self.taxa_erro = taxa_erro
+        self.roteiro: list[str] = []
+        # Valor do cabeçalho Retry-After nas respostas 429 (0 = sem cabeçalho)
+        self.retry_after = 0.0
+        self.porta = None
+        self.requisicoes = 0
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._pronto = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.porta}"
+
+    async def _graphql(self, request):
+        self.requisicoes += 1
+        await asyncio.sleep(self.latencia)
+        forcada = self.roteiro.pop(0) if self.roteiro else None
+        sorteio = random.random()
+        if forcada == '429' or (forcada is None and sorteio < self.taxa_429):
+            cabecalhos = {'Retry-After': f"{self.retry_after:g}"} if self.retry_after else None
+            return web.json_response({"message": "Too Many Requests"}, status=429, headers=cabecalhos)
+        if forcada == '10030' or (forcada is None and sorteio < self.taxa_429 + self.taxa_throttling):
+            return web.json_response({"data": None, "errors": [{"message": "Too many requests",
+                                                                 "extensions": {"code": 10030, "message": "rate limit exceeded"}}]})
+        if forcada == '500' or (forcada is None and sorteio < self.taxa_429 + self.taxa_throttling + self.taxa_erro):
+            return web.json_response({"message": "Internal Server Error"}, status=500)
+        corpo = await request.text()
+        query = json.loads(corpo)["query"]
+        dados, erros = {}, []
+        for alias, origem in re.findall(r'(?:(\w+): )?generateShortLink\(input: \{ originUrl: "([^"]+)"', query):
+            alias = alias or "generateShortLink"
+            if 'invalido' in origem:
+                dados[alias] = None
+                erros.append({"message": "invalid origin url", "path": [alias], "extensions": {"code": 11001}})
+                continue
+            codigo = abs(hash(origem)) % 10**8
+            dados[alias] = {"shortLink": f"https://s.shopee.com.br/af{codigo}"}
+        return web.json_response({"data": dados, "errors": erros} if erros else {"data": dados})
+
+    async def _shortlink(self, request):
+        self.requisicoes += 1
+        await asyncio.sleep(self.latencia)
+        if self.roteiro and self.roteiro[0] == '503':
+            self.roteiro.pop(0)
+            return web.Response(status=503)
+        codigo = request.match_info['codigo']
+        raise web.HTTPFound(f"/oferta/{codigo}")
+
+    async def _oferta(self, request):
+        # Hop intermediário, como o universal-link da Shopee
+        self.requisicoes += 1
+        await asyncio.sleep(self.latencia)
+        raise web.HTTPFound(f"/produto/oferta-i.{request.match_info['codigo']}.1")
+
+    async def _produto(self, request):
+        self.requisicoes += 1
+        return web.Response(text="<html>" + "x" * 50_000 + "</html>", content_type="text/html")
+
+    def _executar(self):
+        self._loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_post('/graphql', self._graphql)
+        app.router.add_get('/s/{codigo}', self._shortlink)
+        app.router.add_get('/oferta/{codigo}', self._oferta)
+        app.router.add_get('/produto/{codigo}', self._produto)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        self._loop.run_until_complete(site.start())
+        self.porta = site._server.sockets[0].getsockname()[1]
+        self._pronto.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+        self._pronto.wait()
+
+    def parar(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+class ShopeeAPIBloqueante(ShopeeAPI):
+    """Reproduz o comportamento antigo: requests síncrono dentro do handler assíncrono."""
+    async def gen_links(self, urls, sub_ids=None, consultar_cache=True, temporarias=None):
+        if sub_ids is None: sub_ids = ["s1", "s2", "s3", "s4", "s5"]
+        links = []
+        for url in urls:
+            gq = {"query": f'''mutation {{ generateShortLink(input: {{ originUrl: \"{url}\", subIds: {json.dumps(sub_ids)} }}) {{ shortLink }} }}'''}
+            p = json.dumps(gq)
+            resp = requests.post(f"{self.base_url}{self.endpoint}", headers=self._auth_header(p), data=p, timeout=30)
+            links.append(resp.json()["data"]["generateShortLink"]["shortLink"])
+        return links
+
+def gerar_mensagens(quantidade: int, links_por_mensagem: int) -> list[str]:
+    mensagens = []
+    for i in range(quantidade):
+        links = [f"https://shopee.com.br/produto-{i}-{j}-i.{1000 + i}.{2000 + j}" for j in range(links_por_mensagem)]
+        mensagens.append("🔥 Oferta imperdível!\n" + "\n".join(f"👉 {l}" for l in links))
+    return mensagens
+
+async def expandir_com_get(link: str) -> str:
+    """Expansão antiga: GET seguindo redirects e baixando o HTML final."""
+    async with bot_cupons.obter_sessao_http().get(link, allow_redirects=True) as resp:
+        await resp.read()
+        return str(resp.url)
+
+async def medir_shortlinks(expandir, links: list[str]) -> float:
+    """Expande os shortlinks concorrentemente e retorna expansões/s."""
+    inicio = time.perf_counter()
+    await asyncio.gather(*(expandir(l) for l in links))
+    duracao = time.perf_counter() - inicio
+    await fechar_sessao_http()
+    return len(links) / duracao
+
+def criar_api(servidor: ServidorShopeeFalso, classe=ShopeeAPI, **kwargs) -> ShopeeAPI:
+    """ShopeeAPI apontada para o servidor falso, com limitador folgado para não distorcer a medição."""
+    kwargs.setdefault('limitador', LimitadorTaxa(taxa=10_000, rajada=10_000, taxa_max=10_000))
+    return classe('app', 'secret', base_url=servidor.base_url, **kwargs)
+
+async def medir_throttling(api: ShopeeAPI, mensagens: list[str]) -> tuple[int, int]:
+    """Retorna (links convertidos, total de links) com o servidor devolvendo 429/erros de limite."""
+    bot_cupons.app.shopee_api = api
+    bot_cupons.app.agrupador_links = AgrupadorLinks(api, 0.05, 20)
+    textos = await asyncio.gather(*(bot_cupons.substituir_links_shopee(m) for m in mensagens))
+    await fechar_sessao_http()
+    convertidos = sum(t.count("s.shopee.com.br/af") for t in textos)
+    total = sum(len(extrair_links_shopee(m)) for m in mensagens)
+    return convertidos, total
+
+async def medir(api: ShopeeAPI, mensagens: list[str], janela: float = 0.0, max_lote: int = 1) -> float:
+    """Processa as mensagens como o Telethon faz (uma task por evento) e retorna msgs/s."""
+    bot_cupons.app.shopee_api = api
+    bot_cupons.app.agrupador_links = AgrupadorLinks(api, janela, max_lote)
+    inicio = time.perf_counter()
+    textos = await asyncio.gather(*(bot_cupons.substituir_links_shopee(m) for m in mensagens))
+    duracao = time.perf_counter() - inicio
+    await fechar_sessao_http()
+    # Um cliente quebrado (ex.: assinatura de gen_links desatualizada) falha em silêncio no agrupador
+    convertidos = sum(t.count("s.shopee.com.br/af") for t in textos)
+    total = sum(len(extrair_links_shopee(m)) for m in mensagens)
+    assert convertidos == total, f"{type(api).__name__} converteu {convertidos}/{total} links; a vazão medida não vale"
+    return len(mensagens) / duracao
+
+def medir_filtro(quantidade: int = 2000, chaves: int = 50, bloqueadas: int = 500) -> tuple[float, float]:
+    """Microbenchmark do filtro: any() por palavra (antigo) x autômato único. Retorna msgs/s de cada."""
+    aleatorio = random.Random(42)
+    def palavra(): return ''.join(aleatorio.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(aleatorio.randint(4, 10)))
+    palavras_chave = [palavra() for _ in range(chaves)]
+    palavras_bloqueadas = [palavra() for _ in range(bloqueadas)]
+    textos = [" ".join(palavra() for _ in range(80)) for _ in range(quantidade)]
+    inicio = time.perf_counter()
+    antigo = [(any(p in t.lower() for p in palavras_chave), any(p in t.lower() for p in palavras_bloqueadas)) for t in textos]
+    tempo_antigo = time.perf_counter() - inicio
+    filtro = FiltroPalavras(palavras_chave, palavras_bloqueadas)
+    inicio = time.perf_counter()
+    novo = [filtro.analisar(t) for t in textos]
+    tempo_novo = time.perf_counter() - inicio
+    assert antigo == novo, "filtro novo divergiu do antigo"
+    return quantidade / tempo_antigo, quantidade / tempo_novo
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do bot com Shopee falsa local")
+    parser.add_argument('--mensagens', type=int, default=50)
+    parser.add_argument('--links', type=int, default=3)
+    parser.add_argument('--latencia', type=float, default=0.2, help="latência injetada em segundos")
+    parser.add_argument('--erros-429', type=float, default=0.3, help="fração de respostas HTTP 429 no cenário de throttling")
+    parser.add_argument('--erros-throttling', type=float, default=0.1, help="fração de erros GraphQL 10030 no cenário de throttling")
+    args = parser.parse_args()
+    configurar_logs(os.getenv('LOG_NIVEL', 'WARNING'))
+    bot_cupons.criar_aplicacao()
+
+    servidor = ServidorShopeeFalso(latencia=args.latencia)
+    servidor.iniciar()
+    mensagens = gerar_mensagens(args.mensagens, args.links)
+    print("📊 BENCHMARK - BOT CUPONS")
+    print("=" * 50)
+    print(f"Mensagens: {args.mensagens} | Links por mensagem: {args.links} | Latência: {args.latencia}s")
+    try:
+        servidor.requisicoes = 0
+        bloqueante = asyncio.run(medir(criar_api(servidor, ShopeeAPIBloqueante), mensagens))
+        print(f"⏳ HTTP bloqueante (requests): {bloqueante:8.2f} msgs/s ({servidor.requisicoes} requisições)")
+        servidor.requisicoes = 0
+        assincrono = asyncio.run(medir(criar_api(servidor), mensagens))
+        print(f"⚡ HTTP assíncrono (aiohttp):  {assincrono:8.2f} msgs/s ({servidor.requisicoes} requisições)")
+        print(f"🚀 Ganho: {assincrono / bloqueante:.1f}x")
+        servidor.requisicoes = 0
+        em_lote = asyncio.run(medir(criar_api(servidor), mensagens, janela=0.05, max_lote=20))
+        print(f"📦 Lotes (janela de 50 ms):    {em_lote:8.2f} msgs/s ({servidor.requisicoes} requisições)")
+        # Repostagem das mesmas ofertas: a segunda passada sai toda do cache
+        cache = CacheLinks(':memory:')
+        api_cache = criar_api(servidor, cache=cache)
+        asyncio.run(medir(api_cache, mensagens, janela=0.05, max_lote=20))
+        com_cache = asyncio.run(medir(api_cache, mensagens, janela=0.05, max_lote=20))
+        print(f"💾 Repostagens com cache:      {com_cache:8.2f} msgs/s {cache.estatisticas()}")
+
+        # Throttling: 429 e erro 10030 devem ser absorvidos por retry/backoff e pelo limitador adaptativo
+        servidor.taxa_429, servidor.taxa_throttling = args.erros_429, args.erros_throttling
+        limitador = LimitadorTaxa(taxa=50, rajada=50, taxa_max=200)
+        disjuntor = DisjuntorCircuito(limiar_falhas=20, tempo_recuperacao=1.0)
+        api_throttling = criar_api(servidor, limitador=limitador, disjuntor=disjuntor, max_tentativas=6, atraso_base=0.05)
+        convertidos, total = asyncio.run(medir_throttling(api_throttling, mensagens))
+        print(f"🚦 Com throttling ({args.erros_429:.0%} 429, {args.erros_throttling:.0%} 10030): "
+              f"{convertidos}/{total} links convertidos {estatisticas_limitador(limitador, disjuntor)}")
+        servidor.taxa_429 = servidor.taxa_throttling = 0.0
+
+        bot_cupons.app.limitador_shopee = LimitadorTaxa(taxa=10_000, rajada=10_000, taxa_max=10_000)
+        shortlinks = [f"{servidor.base_url}/s/{i}" for i in range(args.mensagens)]
+        servidor.requisicoes = 0
+        com_get = asyncio.run(medir_shortlinks(expandir_com_get, shortlinks))
+        print(f"🐢 Shortlinks via GET completo: {com_get:8.2f} exp/s ({servidor.requisicoes} requisições)")
+        servidor.requisicoes = 0
+        com_head = asyncio.run(medir_shortlinks(bot_cupons.expandir_shortlink, shortlinks))
+        print(f"🔗 Shortlinks via HEAD:         {com_head:8.2f} exp/s ({servidor.requisicoes} requisições)")
+        memo = asyncio.run(medir_shortlinks(bot_cupons.expandir_shortlink, shortlinks))
+        print(f"💾 Shortlinks memorizados:      {memo:8.2f} exp/s {bot_cupons.app.cache_shortlinks.estatisticas()}")
+        for estagio, h in sorted(bot_cupons.metricas.latencias.items()):
+            print(f"⏱️  Latência {estagio}: média {h.soma / h.total * 1000:.1f} ms, p99 <= {h.quantil(0.99) * 1000:g} ms ({h.total} medições)")
+    finally:
+        servidor.parar()
+
+    antigo, novo = medir_filtro()
+    print(f"🔎 Filtro any() por palavra:    {antigo:8.0f} msgs/s (50 chaves, 500 bloqueadas)")
+    print(f"🔎 Filtro autômato único:       {novo:8.0f} msgs/s ({novo / antigo:.1f}x)")
+
+if __name__ == "__main__":
+    main()
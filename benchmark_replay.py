@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay offline de um corpus de mensagens pelo caminho completo do bot (handler -> pipeline -> envio)
+
+Usa um cliente Telegram falso em memória e o servidor Shopee falso do benchmark_bot, com latência
+e erros configuráveis. Mede vazão, latência ponta a ponta (p50/p99) e memória.
+
+Uso:
+    python benchmark_replay.py --mensagens 200 --links 3 --taxa 50 --latencia 0.05
+    python benchmark_replay.py --corpus result.json --erros-429 0.1 --flood-wait 0.02
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import resource
+import time
+import tracemalloc
+
+# benchmark_bot define o .env fictício antes de importar o bot
+from benchmark_bot import ServidorShopeeFalso, criar_api, gerar_mensagens
+import bot_cupons
+from analise_paralela import AnalisadorMensagens
+from bot_cupons import AgrupadorLinks, FilaReprocessamento, fechar_sessao_http
+from converter_lote import ler_blocos, ler_export_telegram
+from envio_telegram import AgendadorEnvio
+from limitador import LimitadorTaxa
+from metricas import Metricas, configurar_logs
+from pipeline import PipelineMensagens
+from telethon import errors
+
+REGEX_MARCADOR = re.compile(r'^\[(\d+)\]')
+
+class MensagemFalsa:
+    """Só os atributos de telethon Message que o bot lê."""
+    def __init__(self, msg_id: int, texto: str):
+        self.id = msg_id
+        self.text = texto
+        self.message = texto
+        self.grouped_id = None
+        self.media = None
+        self.photo = None
+        self.document = None
+
+class EventoFalso:
+    def __init__(self, chat_id: int, mensagem: MensagemFalsa):
+        self.chat_id = chat_id
+        self.message = mensagem
+
+class ClienteTelegramFalso:
+    """Substitui o TelegramClient no envio: latência fixa e FloodWait sorteado com `taxa_flood_wait`."""
+    def __init__(self, latencia: float = 0.0, taxa_flood_wait: float = 0.0, espera_flood: int = 0):
+        self.latencia = latencia
+        self.taxa_flood_wait = taxa_flood_wait
+        self.espera_flood = espera_flood
+        self.enviadas: list[tuple[str, str, float]] = []
+        self.flood_waits = 0
+
+    async def _enviar(self, canal: str, texto: str):
+        await asyncio.sleep(self.latencia)
+        if random.random() < self.taxa_flood_wait:
+            self.flood_waits += 1
+            raise errors.FloodWaitError(request=None, capture=self.espera_flood)
+        self.enviadas.append((canal, texto, time.perf_counter()))
+
+    async def send_message(self, canal, texto, **kwargs):
+        await self._enviar(canal, texto)
+
+    async def send_file(self, canal, midia, caption='', **kwargs):
+        await self._enviar(canal, caption)
+
+def carregar_corpus(arquivo: str) -> list[str]:
+    """Exportação JSON do Telegram Desktop (result.json) ou texto com mensagens separadas por linha em branco."""
+    # Mesmos leitores do converter_lote.py (links de entidades pelo href)
+    leitor = ler_export_telegram if arquivo.endswith('.json') else ler_blocos
+    with open(arquivo, encoding='utf-8') as f:
+        return [texto for _, texto in leitor(f) if texto]
+
+def percentil(valores: list[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+async def replay(servidor: ServidorShopeeFalso, textos: list[str], args) -> dict:
+    """Entrega cada texto ao handler no ritmo `args.taxa` e espera todos os envios terminarem."""
+    # Bot montado como em produção, mas apontando para os backends falsos
+    cliente = ClienteTelegramFalso(args.latencia_telegram, args.flood_wait)
+    api = criar_api(servidor, max_tentativas=args.tentativas, atraso_base=0.05)
+    bot_cupons.app.client = cliente
+    bot_cupons.metricas = Metricas()
+    bot_cupons.app.shopee_api = api
+    bot_cupons.app.limitador_shopee = LimitadorTaxa(taxa=10_000, rajada=10_000, taxa_max=10_000)
+    bot_cupons.app.agrupador_links = AgrupadorLinks(api, args.janela_ms / 1000, 20)
+    bot_cupons.app.indice_duplicatas = None
+    bot_cupons.app.analisador = AnalisadorMensagens(args.processos_analise)
+    bot_cupons.app.fila_persistente = None
+    bot_cupons.app.fila_reprocessamento = FilaReprocessamento(args.tentativas, 0.1)
+    bot_cupons.app.agendador_envio = AgendadorEnvio(max_por_minuto=0)
+    bot_cupons.app.pipeline = PipelineMensagens(bot_cupons.converter_mensagem, bot_cupons.enviar_mensagem,
+                                            args.workers, args.tamanho_fila)
+    esperados = len(textos) * len(bot_cupons.app.config.destinos)
+    inicio_msg: dict[int, float] = {}
+    await bot_cupons.app.pipeline.iniciar()
+    inicio = time.perf_counter()
+    tarefas = []
+    for i, texto in enumerate(textos):
+        mensagem = MensagemFalsa(i + 1, f"[{i + 1}] {texto}")
+        inicio_msg[mensagem.id] = time.perf_counter()
+        # Como o Telethon: uma task por evento
+        tarefas.append(asyncio.ensure_future(bot_cupons.handler(EventoFalso(-100, mensagem))))
+        if args.taxa > 0:
+            await asyncio.sleep(1 / args.taxa)
+    await asyncio.gather(*tarefas)
+    contadores = bot_cupons.metricas.contadores
+    limite = time.perf_counter() + args.timeout
+    while contadores.get('enviadas', 0) + contadores.get('envios_falhas', 0) < esperados and time.perf_counter() < limite:
+        await asyncio.sleep(0.01)
+    duracao = time.perf_counter() - inicio
+    await bot_cupons.app.pipeline.parar()
+    await bot_cupons.app.agendador_envio.parar()
+    bot_cupons.app.analisador.fechar()
+    await fechar_sessao_http()
+
+    latencias = []
+    for _, texto, instante in cliente.enviadas:
+        marcador = REGEX_MARCADOR.match(texto)
+        if marcador:
+            latencias.append(instante - inicio_msg[int(marcador.group(1))])
+    convertidos = sum(texto.count('s.shopee.com.br/af') for _, texto, _ in cliente.enviadas)
+    return {
+        'enviadas': len(cliente.enviadas), 'esperadas': esperados, 'duracao': duracao,
+        'vazao': len(cliente.enviadas) / duracao if duracao else 0.0,
+        'p50': percentil(latencias, 0.5), 'p99': percentil(latencias, 0.99),
+        'links_convertidos': convertidos, 'flood_waits': cliente.flood_waits,
+        'requisicoes_shopee': servidor.requisicoes, 'contadores': dict(contadores),
+    }
+
+async def medir_substituicao(servidor: ServidorShopeeFalso, textos: list[str], janela_ms: float) -> dict:
+    """Latência de substituir_links_shopee isolada, com todas as mensagens chegando juntas."""
+    api = criar_api(servidor)
+    bot_cupons.app.shopee_api = api
+    bot_cupons.app.agrupador_links = AgrupadorLinks(api, janela_ms / 1000, 20)
+    async def medir_uma(texto):
+        inicio = time.perf_counter()
+        await bot_cupons.substituir_links_shopee(texto)
+        return time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    latencias = await asyncio.gather(*(medir_uma(t) for t in textos))
+    duracao = time.perf_counter() - inicio
+    await fechar_sessao_http()
+    return {'vazao': len(textos) / duracao, 'p50': percentil(latencias, 0.5), 'p99': percentil(latencias, 0.99)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay offline do bot com Telegram e Shopee falsos")
+    parser.add_argument('--corpus', help="result.json do Telegram Desktop ou texto com mensagens separadas por linha em branco")
+    parser.add_argument('--mensagens', type=int, default=200, help="tamanho do corpus sintético (sem --corpus)")
+    parser.add_argument('--links', type=int, default=3, help="links por mensagem no corpus sintético")
+    parser.add_argument('--taxa', type=float, default=0, help="mensagens por segundo entregues ao handler (0 = todas de uma vez)")
+    parser.add_argument('--latencia', type=float, default=0.05, help="latência da Shopee falsa em segundos")
+    parser.add_argument('--latencia-telegram', type=float, default=0.01, help="latência de cada envio ao Telegram falso")
+    parser.add_argument('--erros-429', type=float, default=0.0, help="fração de respostas HTTP 429 da Shopee")
+    parser.add_argument('--erros-throttling', type=float, default=0.0, help="fração de erros GraphQL 10030")
+    parser.add_argument('--erros-500', type=float, default=0.0, help="fração de respostas HTTP 500 da Shopee")
+    parser.add_argument('--flood-wait', type=float, default=0.0, help="fração de envios que recebem FloodWait")
+    parser.add_argument('--tentativas', type=int, default=3)
+    parser.add_argument('--janela-ms', type=float, default=50)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--processos-analise', type=int, default=0, help="processos para filtro e impressão digital (0 = no loop)")
+    parser.add_argument('--tamanho-fila', type=int, default=100)
+    parser.add_argument('--timeout', type=float, default=120, help="tempo máximo esperando os envios terminarem")
+    parser.add_argument('--memoria', action='store_true', help="mede o pico de memória Python com tracemalloc (mais lento)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    configurar_logs(os.getenv('LOG_NIVEL', 'OFF'))
+    bot_cupons.criar_aplicacao()
+    random.seed(args.seed)
+
+    textos = carregar_corpus(args.corpus) if args.corpus else gerar_mensagens(args.mensagens, args.links)
+    servidor = ServidorShopeeFalso(args.latencia, args.erros_429, args.erros_throttling, args.erros_500)
+    servidor.iniciar()
+    print("📊 REPLAY OFFLINE - BOT CUPONS")
+    print("=" * 50)
+    print(f"Mensagens: {len(textos)} | Taxa: {args.taxa or 'máxima'} | Latência Shopee: {args.latencia}s | "
+          f"Erros: {args.erros_429:.0%} 429, {args.erros_throttling:.0%} 10030, {args.erros_500:.0%} 500 | FloodWait: {args.flood_wait:.0%}")
+    try:
+        if args.memoria:
+            tracemalloc.start()
+        r = asyncio.run(replay(servidor, textos, args))
+        pico = tracemalloc.get_traced_memory()[1] if args.memoria else None
+        tracemalloc.stop()
+        print(f"📨 Ponta a ponta: {r['enviadas']}/{r['esperadas']} envios em {r['duracao']:.2f}s ({r['vazao']:.1f} msgs/s)")
+        print(f"⏱️  Latência ponta a ponta: p50 {r['p50'] * 1000:.0f} ms | p99 {r['p99'] * 1000:.0f} ms")
+        print(f"🔗 Links convertidos: {r['links_convertidos']} | Requisições Shopee: {r['requisicoes_shopee']} | FloodWaits: {r['flood_waits']}")
+        print(f"🧮 Contadores: {r['contadores']}")
+        for estagio, h in sorted(bot_cupons.metricas.latencias.items()):
+            print(f"   {estagio:<10} média {h.soma / h.total * 1000:7.1f} ms | p99 <= {h.quantil(0.99) * 1000:g} ms ({h.total})")
+        servidor.requisicoes = 0
+        s = asyncio.run(medir_substituicao(servidor, textos, args.janela_ms))
+        print(f"🔁 substituir_links_shopee: {s['vazao']:.1f} msgs/s | p50 {s['p50'] * 1000:.0f} ms | p99 {s['p99'] * 1000:.0f} ms")
+    finally:
+        servidor.parar()
+    if pico is not None:
+        print(f"💾 Pico de memória Python (tracemalloc): {pico / 1024 / 1024:.1f} MiB")
+    print(f"💾 RSS máximo do processo: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+    # Regressão grave: mensagens que não chegaram ao destino
+    if r['enviadas'] < r['esperadas']:
+        print(f"⚠️  {r['esperadas'] - r['enviadas']} envio(s) não concluído(s)")
+
+if __name__ == "__main__":
+    main()
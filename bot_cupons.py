@@ -1,23 +1,68 @@
 import os
-import re
 import asyncio
-from telethon import TelegramClient, events
-from dotenv import load_dotenv
-import requests
+from telethon import TelegramClient, errors, events, utils
+from telethon.tl.types import MessageMediaWebPage
+from dotenv import load_dotenv, find_dotenv, dotenv_values
+import aiohttp
 import json
 import hashlib
 import time
-from typing import Dict, Optional
+import random
+import signal
+import logging
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import urljoin, urlsplit
+from cache_links import CacheLinks, CacheMemoria
+from links_shopee import (extrair_links_shopee, reconstruir_texto, normalizar_url_shopee, is_shopee_url,
+                          e_shortlink, e_url_produto)
+from pipeline import PipelineMensagens
+from fila_persistente import FilaPersistente
+from mapeamento_mensagens import MapeamentoMensagens
+from envio_telegram import AgendadorEnvio
+from deduplicacao import IndiceDuplicatas
+from analise_paralela import AnalisadorMensagens
+from filtro_palavras import FiltroPalavras, SubstituidorPalavras
+from limitador import LimitadorTaxa, DisjuntorCircuito, atraso_backoff, estatisticas as estatisticas_limitador
+from metricas import Metricas, configurar_logs
 
-# Carregar variáveis do .env
-load_dotenv()
+log = logging.getLogger('bot_cupons')
+# Contadores e latências por estágio (filtro, expandir, converter, substituir, envio)
+metricas = Metricas()
+
+SUB_IDS_PADRAO = ["s1", "s2", "s3", "s4", "s5"]
+
+# Sessão HTTP compartilhada (keep-alive) usada por todas as chamadas à Shopee
+_sessao_http: Optional[aiohttp.ClientSession] = None
+
+def obter_sessao_http() -> aiohttp.ClientSession:
+    """Retorna a sessão aiohttp compartilhada, criando-a no loop atual se necessário."""
+    global _sessao_http
+    if _sessao_http is None or _sessao_http.closed:
+        conector = aiohttp.TCPConnector(limit=int(os.getenv('LIMITE_CONEXOES_HTTP', '20')), keepalive_timeout=60, ttl_dns_cache=300)
+        _sessao_http = aiohttp.ClientSession(connector=conector)
+    return _sessao_http
+
+async def fechar_sessao_http():
+    """Fecha a sessão HTTP compartilhada (chamado ao desligar o bot)."""
+    global _sessao_http
+    if _sessao_http is not None and not _sessao_http.closed:
+        await _sessao_http.close()
+    _sessao_http = None
 
 class ShopeeAPI:
-    def __init__(self, app_id: str, secret: str):
+    def __init__(self, app_id: str, secret: str, base_url: str = "https://open-api.affiliate.shopee.com.br",
+                 cache: Optional[CacheLinks] = None, max_lote: int = 20, limitador: Optional[LimitadorTaxa] = None,
+                 disjuntor: Optional[DisjuntorCircuito] = None, max_tentativas: int = 3, atraso_base: float = 1.0):
         self.app_id = app_id
         self.secret = secret
-        self.base_url = "https://open-api.affiliate.shopee.com.br"
+        self.base_url = base_url
         self.endpoint = "/graphql"
+        self.cache = cache
+        self.max_lote = max_lote
+        self.limitador = limitador or LimitadorTaxa()
+        self.disjuntor = disjuntor or DisjuntorCircuito()
+        self.max_tentativas = max_tentativas
+        self.atraso_base = atraso_base
     def _gen_sig(self, payload: str) -> tuple[str, str]:
         ts = str(int(time.time()))
         msg = f"{self.app_id}{ts}{payload}{self.secret}"
@@ -27,56 +72,278 @@ class ShopeeAPI:
         sig, ts = self._gen_sig(payload)
         auth_h = f"SHA256 Credential={self.app_id}, Timestamp={ts}, Signature={sig}"
         return {"Authorization": auth_h, "Content-Type": "application/json"}
-    def gen_link(self, url: str, sub_ids: Optional[list[str]] = None) -> Optional[str]:
-        if sub_ids is None: sub_ids = ["s1", "s2", "s3", "s4", "s5"]
-        gq = {"query": f'''mutation {{ generateShortLink(input: {{ originUrl: \"{url}\", subIds: {json.dumps(sub_ids)} }}) {{ shortLink }} }}'''}
+    async def gen_link(self, url: str, sub_ids: Optional[list[str]] = None) -> Optional[str]:
+        return (await self.gen_links([url], sub_ids))[0]
+    def buscar_cache(self, url: str, sub_ids: Optional[list[str]] = None) -> Optional[str]:
+        if self.cache is None: return None
+        if sub_ids is None: sub_ids = SUB_IDS_PADRAO
+        return self.cache.obter(CacheLinks.gerar_chave(normalizar_url_shopee(url), sub_ids))
+    async def gen_links(self, urls: list[str], sub_ids: Optional[list[str]] = None, consultar_cache: bool = True,
+                        temporarias: Optional[set[str]] = None) -> list[Optional[str]]:
+        """Converte vários links com uma mutation assinada por lote; o resultado segue a ordem de `urls`.
+
+        `temporarias` recebe as URLs não convertidas por uma falha que pode passar (429, erro 10030,
+        rede, circuit breaker aberto); as demais (ex.: URL inválida) não adianta tentar de novo.
+        """
+        if sub_ids is None: sub_ids = SUB_IDS_PADRAO
+        resultados: list[Optional[str]] = [None] * len(urls)
+        chaves: list[Optional[str]] = [None] * len(urls)
+        # URLs ainda não convertidas -> posições em que aparecem (repetidas vão uma vez só)
+        pendentes: Dict[str, list[int]] = {}
+        for i, url in enumerate(urls):
+            if self.cache is not None:
+                chaves[i] = CacheLinks.gerar_chave(normalizar_url_shopee(url), sub_ids)
+                if consultar_cache: resultados[i] = self.cache.obter(chaves[i])
+            if resultados[i] is None:
+                pendentes.setdefault(url, []).append(i)
+        fila = list(pendentes)
+        for inicio in range(0, len(fila), self.max_lote):
+            lote = fila[inicio:inicio + self.max_lote]
+            links, falhas_temporarias = await self._enviar_lote(lote, sub_ids)
+            if temporarias is not None: temporarias.update(lote[i] for i in falhas_temporarias)
+            for url, link in zip(lote, links):
+                if not link: continue
+                for i in pendentes[url]:
+                    resultados[i] = link
+                    if chaves[i]: self.cache.salvar(chaves[i], link)
+        return resultados
+    async def _enviar_lote(self, urls: list[str], sub_ids: list[str]) -> tuple[list[Optional[str]], set[int]]:
+        """Envia o lote respeitando o limitador, com retry/backoff só para o que falhou.
+
+        Retorna os links e as posições que ficaram sem link por uma falha temporária.
+        """
+        links: list[Optional[str]] = [None] * len(urls)
+        restantes = list(range(len(urls)))
+        for tentativa in range(self.max_tentativas):
+            if not self.disjuntor.permite():
+                log.warning("Shopee indisponível (circuit breaker aberto), conversão adiada")
+                break
+            await self.limitador.adquirir()
+            resultado, throttling, retry_after, limitadas = await self._postar_mutation([urls[i] for i in restantes], sub_ids)
+            if throttling:
+                self.limitador.throttling(retry_after)
+            if resultado is None:
+                if not throttling: self.disjuntor.falha()
+            else:
+                self.disjuntor.sucesso()
+                if not throttling: self.limitador.sucesso()
+                for i, link in zip(restantes, resultado):
+                    links[i] = link
+                # Erros que não são de limite (ex.: URL inválida) não melhoram com retry
+                restantes = [i for j, i in enumerate(restantes) if links[i] is None and j in limitadas]
+                if not restantes: break
+            if tentativa + 1 < self.max_tentativas:
+                await asyncio.sleep(atraso_backoff(tentativa, self.atraso_base))
+        # O que sobrou falhou por limite, rede ou circuit breaker
+        return links, set(restantes)
+    async def _postar_mutation(self, urls: list[str], sub_ids: list[str]) -> tuple[Optional[list[Optional[str]]], bool, float, set[int]]:
+        """Retorna (links na ordem de `urls` ou None se a requisição falhou, houve throttling, Retry-After,
+        posições sem link por erro de limite)."""
+        # Um campo generateShortLink com alias (l0, l1, ...) por URL na mesma mutation
+        campos = " ".join(f'l{i}: generateShortLink(input: {{ originUrl: {json.dumps(url)}, subIds: {json.dumps(sub_ids)} }}) {{ shortLink }}'
+                          for i, url in enumerate(urls))
+        gq = {"query": f"mutation {{ {campos} }}"}
         p = json.dumps(gq)
         h = self._auth_header(p)
         try:
-            resp = requests.post(url=f"{self.base_url}{self.endpoint}", headers=h, json=gq, timeout=30)
-            resp.raise_for_status()
-            data = resp.json()
-            if data.get("errors"): print(f"Erro GraphQL: {data['errors']}"); return None
-            link = data.get("data", {}).get("generateShortLink", {}).get("shortLink")
-            if link: return link
-            print("Link não encontrado na resposta.")
-            print(f"Resposta: {data}")
-            return None
-        except requests.exceptions.RequestException as e: print(f"Falha na requisição: {e}"); return None
-        except json.JSONDecodeError as e: print(f"Falha ao analisar JSON: {e}"); return None
-        except Exception as e: print(f"Erro inesperado: {e}"); return None
+            sessao = obter_sessao_http()
+            async with sessao.post(f"{self.base_url}{self.endpoint}", headers=h, data=p, timeout=aiohttp.ClientTimeout(total=30)) as resp:
+                if resp.status == 429:
+                    log.warning("Limite de requisições da Shopee atingido (HTTP 429).")
+                    metricas.incrementar('shopee_throttling')
+                    try: retry_after = float(resp.headers.get('Retry-After', 0))
+                    except ValueError: retry_after = 0.0
+                    return None, True, retry_after, set()
+                resp.raise_for_status()
+                data = await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e: log.error(f"Falha na requisição: {e}"); metricas.incrementar('shopee_falhas'); return None, False, 0.0, set()
+        except json.JSONDecodeError as e: log.error(f"Falha ao analisar JSON: {e}"); metricas.incrementar('shopee_falhas'); return None, False, 0.0, set()
+        except Exception as e: log.error(f"Erro inesperado: {e}"); metricas.incrementar('shopee_falhas'); return None, False, 0.0, set()
+        # Erros parciais trazem o alias em "path"; erros sem path valem para o lote inteiro
+        erros: Dict[str, dict] = {}
+        for erro in data.get("errors") or []:
+            caminho = erro.get("path") or []
+            erros[str(caminho[0]) if caminho else "*"] = erro
+        throttling = any(e_erro_throttling(erro) for erro in erros.values())
+        dados = data.get("data") or {}
+        links: list[Optional[str]] = []
+        limitadas: set[int] = set()
+        for i, url in enumerate(urls):
+            link = (dados.get(f"l{i}") or {}).get("shortLink")
+            if not link:
+                erro = erros.get(f"l{i}") or erros.get("*")
+                if erro:
+                    log.warning(f"Erro GraphQL ({url}): {erro.get('message', erro)}")
+                    if e_erro_throttling(erro): limitadas.add(i)
+                else: log.warning(f"Link não encontrado na resposta para {url}.")
+            links.append(link)
+        return links, throttling, 0.0, limitadas
+
+def e_erro_throttling(erro: dict) -> bool:
+    """Identifica o erro GraphQL de limite de requisições da Shopee (código 10030)."""
+    texto = json.dumps(erro).lower()
+    return '10030' in texto or 'rate limit' in texto or 'too many' in texto
+
+class AgrupadorLinks:
+    """Junta as conversões pedidas dentro de uma janela curta (inclusive de mensagens diferentes) em lotes."""
+    def __init__(self, api: ShopeeAPI, janela: float = 0.05, max_lote: int = 20):
+        self.api = api
+        self.janela = janela
+        self.max_lote = max_lote
+        # Cada futuro recebe (link, falha temporária)
+        self._pendentes: Dict[tuple[str, ...], list[tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[tuple[str, ...], asyncio.TimerHandle] = {}
+        self._tarefas: set[asyncio.Task] = set()
+    async def converter(self, url: str, sub_ids: Optional[list[str]] = None,
+                        temporarias: Optional[set[str]] = None) -> Optional[str]:
+        """`temporarias` recebe `url` se ela ficar sem link por uma falha temporária (ver ShopeeAPI.gen_links)."""
+        if sub_ids is None: sub_ids = SUB_IDS_PADRAO
+        # Acerto no cache não precisa esperar a janela do lote
+        link = self.api.buscar_cache(url, sub_ids)
+        if link: return link
+        chave = tuple(sub_ids)
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        fila = self._pendentes.setdefault(chave, [])
+        fila.append((url, futuro))
+        if len(fila) >= self.max_lote:
+            self._disparar(chave)
+        elif len(fila) == 1:
+            self._timers[chave] = loop.call_later(self.janela, self._disparar, chave)
+        link, temporaria = await futuro
+        if temporaria and temporarias is not None: temporarias.add(url)
+        return link
+    def _disparar(self, chave: tuple[str, ...]):
+        timer = self._timers.pop(chave, None)
+        if timer: timer.cancel()
+        fila = self._pendentes.pop(chave, None)
+        if not fila: return
+        tarefa = asyncio.ensure_future(self._enviar(list(chave), fila))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+    async def _enviar(self, sub_ids: list[str], fila: list[tuple[str, asyncio.Future]]):
+        temporarias: set[str] = set()
+        try:
+            links = await self.api.gen_links([url for url, _ in fila], sub_ids, consultar_cache=False, temporarias=temporarias)
+        except Exception as e:
+            log.error(f"Falha no lote de conversão: {e}")
+            links = [None] * len(fila)
+            temporarias = {url for url, _ in fila}
+        for (url, futuro), link in zip(fila, links):
+            if not futuro.done(): futuro.set_result((link, url in temporarias))
+
+STATUS_REDIRECT = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 10
+
+async def expandir_shortlink(link: str) -> str:
+    """Expande um shortlink Shopee para o link de produto real.
 
-def expandir_shortlink(link: str) -> str:
-    """Expande um shortlink Shopee para o link de produto real."""
+    Segue os redirects com HEAD (sem baixar o HTML da página) e para assim que
+    o destino já é reconhecível como link de produto. Só memoriza o resultado se
+    houve redirect ou a resposta foi 2xx: um erro no servidor não vira expansão.
+    """
+    partes = urlsplit(link)
+    chave = f"{partes.netloc.lower()}{partes.path}"
+    final_url = app.cache_shortlinks.obter(chave)
+    if final_url:
+        return final_url
+    inicio = time.perf_counter()
     try:
-        resp = requests.get(link, allow_redirects=True, timeout=10)
-        final_url = resp.url
-        print(f"[INFO] Shortlink expandido: {link} -> {final_url}")
+        sessao = obter_sessao_http()
+        timeout = aiohttp.ClientTimeout(total=10)
+        final_url = link
+        redirecionado = False
+        await app.limitador_shopee.adquirir()
+        for _ in range(MAX_REDIRECTS):
+            async with sessao.head(final_url, allow_redirects=False, timeout=timeout) as resp:
+                status, location = resp.status, resp.headers.get('Location')
+            if status == 429:
+                app.limitador_shopee.throttling()
+                raise aiohttp.ClientResponseError(resp.request_info, (), status=429, message="Too Many Requests")
+            if status == 405:
+                # Servidor não aceita HEAD: GET sem ler o corpo da resposta
+                async with sessao.get(final_url, allow_redirects=False, timeout=timeout) as resp:
+                    status, location = resp.status, resp.headers.get('Location')
+            if status not in STATUS_REDIRECT or not location:
+                break
+            final_url = urljoin(final_url, location)
+            redirecionado = True
+            if e_url_produto(final_url):
+                break
+        if status >= 500 or not (redirecionado or 200 <= status < 300):
+            metricas.incrementar('shortlinks_falhas')
+            log.warning(f"Shortlink {link} não expandido (HTTP {status}), tentando de novo na próxima vez")
+            return final_url
+        app.cache_shortlinks.salvar(chave, final_url)
+        metricas.incrementar('shortlinks_expandidos')
+        log.debug(f"Shortlink expandido: {link} -> {final_url}")
         return final_url
     except Exception as e:
-        print(f"[ERRO] Falha ao expandir shortlink {link}: {e}")
+        metricas.incrementar('shortlinks_falhas')
+        log.warning(f"Falha ao expandir shortlink {link}: {e}")
         return link
+    finally:
+        metricas.observar('expandir', time.perf_counter() - inicio)
 
-def is_shopee_url(url: str) -> bool:
-    domains = ["shopee.com", "shopee.co.id", "shopee.com.my", "shopee.com.sg", 
-               "shopee.com.ph", "shopee.co.th", "shopee.vn", "shopee.com.tw", "shopee.com.br"]
-    return any(d in url.lower() for d in domains)
+def ler_lista(valor: str, minusculas: bool = True) -> list[str]:
+    itens = [p.strip() for p in valor.split(',') if p.strip()]
+    return [p.lower() for p in itens] if minusculas else itens
 
-def substituir_palavras_especificas(texto: str, substituicoes: dict) -> str:
-    """Substitui palavras específicas no texto"""
-    if not substituicoes:
-        return texto
-    
-    texto_modificado = texto
-    for palavra_original, palavra_nova in substituicoes.items():
-        # Substitui a palavra exata (case insensitive)
-        pattern = re.compile(re.escape(palavra_original), re.IGNORECASE)
-        texto_modificado = pattern.sub(palavra_nova, texto_modificado)
-        print(f"[INFO] Substituído: '{palavra_original}' -> '{palavra_nova}'")
-    
-    return texto_modificado
+def ler_substituicoes(valor: str) -> Dict[str, str]:
+    """Formato: palavra_original:nova_palavra, separadas por vírgula."""
+    substituicoes = {}
+    for item in valor.split(','):
+        if ':' in item:
+            original, nova = item.split(':', 1)
+            substituicoes[original.strip()] = nova.strip()
+    return substituicoes
 
-class Configuracao:
+class Destino:
+    """Canal de destino com suas próprias regras; filtro e substituições são compilados uma vez."""
+    def __init__(self, nome: str, canal: str, palavras_chave: list[str], palavras_bloqueadas: list[str],
+                 substituicoes: Dict[str, str], sub_ids: list[str], palavra_inteira: bool = False, ignorar_acentos: bool = False):
+        self.nome = nome
+        self.canal = canal
+        self.palavras_chave = palavras_chave
+        self.palavras_bloqueadas = palavras_bloqueadas
+        self.substituicoes = substituicoes
+        self.sub_ids = tuple(sub_ids)
+        # Forma serializável das regras, para a análise em outro processo
+        self.regras_filtro = (tuple(palavras_chave), tuple(palavras_bloqueadas), palavra_inteira, ignorar_acentos)
+        self.filtro = FiltroPalavras(palavras_chave, palavras_bloqueadas, palavra_inteira, ignorar_acentos)
+        self.substituidor = SubstituidorPalavras(substituicoes)
+    def __repr__(self) -> str:
+        return f"{self.nome}->{self.canal} (sub_ids={list(self.sub_ids)})"
+
+class ConfiguracaoConversao:
+    """Só o que a conversão de links usa (SHOPEE_*, cache, lotes); não exige Telegram, canais nem destinos."""
+    def __init__(self):
+        self.shopee_app_id = os.getenv('SHOPEE_APP_ID')
+        self.shopee_secret = os.getenv('SHOPEE_SECRET')
+        if not self.shopee_app_id or not self.shopee_secret:
+            raise ValueError('SHOPEE_APP_ID e SHOPEE_SECRET devem estar definidos no .env!')
+        self.sub_ids = ler_lista(os.getenv('SUB_IDS', ''), minusculas=False) or SUB_IDS_PADRAO
+        # Máximo de shortlinks expandidos em paralelo por mensagem; a conversão em si vai em lote
+        # pelo agrupador (LOTE_MAX_LINKS) e o ritmo é o do limitador (SHOPEE_TAXA_REQ)
+        self.limite_conversoes = int(os.getenv('LIMITE_CONVERSOES', '5'))
+        # Pede uma única conversão para links repetidos na mesma mensagem. Não muda as chamadas de rede:
+        # com false, o agrupador de lotes e o cache juntam os pedidos iguais do mesmo jeito
+        self.deduplicar_links = os.getenv('DEDUPLICAR_LINKS', 'true').strip().lower() in ('1', 'true', 'sim', 's')
+        # Cache persistente de links convertidos (CACHE_LINKS_ARQUIVO vazio desativa)
+        self.cache_arquivo = os.getenv('CACHE_LINKS_ARQUIVO', 'cache_links.db').strip()
+        self.cache_ttl = float(os.getenv('CACHE_LINKS_TTL', str(7 * 24 * 3600)))
+        self.cache_max_itens = int(os.getenv('CACHE_LINKS_MAX', '50000'))
+        # Conversões em lote: máximo de links por mutation e janela para juntar mensagens próximas
+        self.lote_max_links = int(os.getenv('LOTE_MAX_LINKS', '20'))
+        self.janela_lote = float(os.getenv('JANELA_LOTE_MS', '50')) / 1000
+        # Limite de requisições por segundo à Shopee (adaptativo) e tentativas por lote
+        self.shopee_taxa = float(os.getenv('SHOPEE_TAXA_REQ', '5'))
+        self.shopee_tentativas = int(os.getenv('SHOPEE_TENTATIVAS', '3'))
+        self.cache_shortlinks_max = int(os.getenv('CACHE_SHORTLINKS_MAX', '10000'))
+        # Logs: DEBUG, INFO, WARNING, ERROR ou OFF
+        self.log_nivel = os.getenv('LOG_NIVEL', 'INFO')
+
+class Configuracao(ConfiguracaoConversao):
     def __init__(self):
         api_id_raw = os.getenv('API_ID')
         api_hash_raw = os.getenv('API_HASH')
@@ -84,106 +351,719 @@ class Configuracao:
             raise ValueError('API_ID e API_HASH devem estar definidos no .env!')
         self.api_id = int(api_id_raw)
         self.api_hash = str(api_hash_raw)
+        super().__init__()
         # Lista de canais de origem (separados por vírgula)
         canais_origem_raw = os.getenv('CANAL_ORIGEM', '')
         self.canais_origem = [c.strip() for c in canais_origem_raw.split(',') if c.strip()]
-        self.canal_destino = str(os.getenv('CANAL_DESTINO'))
-        self.shopee_app_id = os.getenv('SHOPEE_APP_ID')
-        self.shopee_secret = os.getenv('SHOPEE_SECRET')
-        self.palavras_chave = [p.strip().lower() for p in os.getenv('PALAVRAS_CHAVE', '').split(',') if p.strip()]
+        self.canal_destino = os.getenv('CANAL_DESTINO', '').strip()
+        self.palavras_chave = ler_lista(os.getenv('PALAVRAS_CHAVE', ''))
         # Lista de palavras bloqueadas (mensagens com essas palavras não serão enviadas)
-        self.palavras_bloqueadas = [p.strip().lower() for p in os.getenv('PALAVRAS_BLOQUEADAS', '').split(',') if p.strip()]
+        self.palavras_bloqueadas = ler_lista(os.getenv('PALAVRAS_BLOQUEADAS', ''))
         # Mapeamento de palavras para substituir (formato: palavra_original:nova_palavra)
-        substituicoes_raw = os.getenv('SUBSTITUICOES', '')
-        self.substituicoes = {}
-        if substituicoes_raw:
-            for item in substituicoes_raw.split(','):
-                if ':' in item:
-                    original, nova = item.split(':', 1)
-                    self.substituicoes[original.strip()] = nova.strip()
-        if not all([self.api_id, self.api_hash, self.canais_origem, self.canal_destino, self.shopee_app_id, self.shopee_secret]):
+        self.substituicoes = ler_substituicoes(os.getenv('SUBSTITUICOES', ''))
+        # Opções do filtro de palavras: casar só palavras inteiras e/ou ignorar acentos
+        self.filtro_palavra_inteira = os.getenv('FILTRO_PALAVRA_INTEIRA', 'false').strip().lower() in ('1', 'true', 'sim', 's')
+        self.filtro_ignorar_acentos = os.getenv('FILTRO_IGNORAR_ACENTOS', 'false').strip().lower() in ('1', 'true', 'sim', 's')
+        # Supressão de ofertas repetidas entre canais (janela em segundos; arquivo vazio = só memória)
+        self.dedup_ativo = os.getenv('DEDUP_ATIVO', 'true').strip().lower() in ('1', 'true', 'sim', 's')
+        self.dedup_janela = float(os.getenv('DEDUP_JANELA', '1800'))
+        self.dedup_max_itens = int(os.getenv('DEDUP_MAX', '10000'))
+        self.dedup_distancia = int(os.getenv('DEDUP_DISTANCIA', '3'))
+        self.dedup_arquivo = os.getenv('DEDUP_ARQUIVO', '').strip()
+        # Registros novos entre gravações do índice em DEDUP_ARQUIVO (também grava a cada 60 s)
+        self.dedup_salvar_a_cada = int(os.getenv('DEDUP_SALVAR_A_CADA', '20'))
+        # Pipeline: workers de conversão e tamanho máximo da fila de entrada (backpressure)
+        self.workers_conversao = int(os.getenv('WORKERS_CONVERSAO', '4'))
+        self.tamanho_fila = int(os.getenv('TAMANHO_FILA', '100'))
+        # Fila persistente (vazio desativa) e recuperação das mensagens postadas com o bot parado
+        self.fila_arquivo = os.getenv('FILA_ARQUIVO', 'fila_mensagens.db').strip()
+        self.backfill_max = int(os.getenv('BACKFILL_MAX', '500'))
+        self.backfill_taxa = float(os.getenv('BACKFILL_TAXA', '2'))
+        # Origem -> mensagem enviada, para propagar edições (vazio desativa)
+        self.mapeamento_arquivo = os.getenv('MAPEAMENTO_ARQUIVO', 'mapeamento_mensagens.db').strip()
+        # Ritmo máximo de envios por minuto ao canal de destino
+        self.envio_max_por_minuto = float(os.getenv('ENVIO_MAX_POR_MINUTO', '20'))
+        # Mensagens com links não convertidos são reprocessadas depois (backoff a partir de REPROCESSAR_ATRASO s)
+        self.reprocessar_tentativas = int(os.getenv('REPROCESSAR_TENTATIVAS', '5'))
+        self.reprocessar_atraso = float(os.getenv('REPROCESSAR_ATRASO', '30'))
+        # Métricas: porta local do /metrics (0 desativa) e intervalo em segundos do resumo periódico
+        # no log (0 desativa)
+        self.metricas_porta = int(os.getenv('METRICAS_PORTA', '0'))
+        self.metricas_intervalo = float(os.getenv('METRICAS_INTERVALO', '300'))
+        # Intervalo em segundos para checar mudanças no .env (0 desativa; SIGHUP recarrega na hora)
+        self.config_intervalo = float(os.getenv('CONFIG_INTERVALO', '5'))
+        # Modo supervisor: canais de origem divididos entre N processos ouvintes (0 ou 1 = um processo só)
+        self.supervisor_processos = int(os.getenv('SUPERVISOR_PROCESSOS', '0'))
+        # Processos para o filtro de palavras e a impressão digital (0 = no próprio loop)
+        self.processos_analise = int(os.getenv('PROCESSOS_ANALISE', '0'))
+        self.destinos = self._ler_destinos()
+        if not all([self.api_id, self.api_hash, self.canais_origem, self.destinos]):
             raise ValueError('Todas as variáveis obrigatórias devem estar definidas no .env!')
         if not self.canais_origem:
             raise ValueError('Pelo menos um CANAL_ORIGEM deve estar definido no .env!')
 
-config = Configuracao()
-if not config.shopee_app_id or not config.shopee_secret:
-    raise ValueError('SHOPEE_APP_ID e SHOPEE_SECRET devem estar definidos no .env!')
-shopee_api = ShopeeAPI(config.shopee_app_id, config.shopee_secret)
+    def _ler_destinos(self) -> list[Destino]:
+        """DESTINOS=nome1,nome2 com DESTINO_<NOME>_CANAL, _PALAVRAS_CHAVE, _PALAVRAS_BLOQUEADAS,
+        _SUBSTITUICOES e _SUB_IDS; o que não for definido herda as regras globais.
+        Sem DESTINOS, usa apenas CANAL_DESTINO com as regras globais."""
+        nomes = ler_lista(os.getenv('DESTINOS', ''), minusculas=False)
+        if not nomes:
+            if not self.canal_destino:
+                return []
+            return [Destino('padrao', self.canal_destino, self.palavras_chave, self.palavras_bloqueadas, self.substituicoes,
+                            self.sub_ids, self.filtro_palavra_inteira, self.filtro_ignorar_acentos)]
+        destinos = []
+        for nome in nomes:
+            prefixo = f"DESTINO_{nome.upper()}_"
+            canal = os.getenv(prefixo + 'CANAL', '').strip()
+            if not canal:
+                raise ValueError(f'{prefixo}CANAL deve estar definido no .env!')
+            palavras_chave = os.getenv(prefixo + 'PALAVRAS_CHAVE')
+            palavras_bloqueadas = os.getenv(prefixo + 'PALAVRAS_BLOQUEADAS')
+            substituicoes = os.getenv(prefixo + 'SUBSTITUICOES')
+            sub_ids = os.getenv(prefixo + 'SUB_IDS')
+            destinos.append(Destino(
+                nome, canal,
+                ler_lista(palavras_chave) if palavras_chave is not None else self.palavras_chave,
+                ler_lista(palavras_bloqueadas) if palavras_bloqueadas is not None else self.palavras_bloqueadas,
+                ler_substituicoes(substituicoes) if substituicoes is not None else self.substituicoes,
+                (ler_lista(sub_ids, minusculas=False) or SUB_IDS_PADRAO) if sub_ids is not None else self.sub_ids,
+                self.filtro_palavra_inteira, self.filtro_ignorar_acentos))
+        return destinos
+
+class Conversor:
+    """Só a conversão de links: caches, limitador e circuit breaker da Shopee, API e agrupador de lotes."""
+    def __init__(self, config: ConfiguracaoConversao):
+        self.config = config
+        # Shortlinks já expandidos (código -> link do produto), limitado em memória
+        self.cache_shortlinks = CacheMemoria(config.cache_shortlinks_max)
+        self.cache_links = CacheLinks(config.cache_arquivo, config.cache_ttl, config.cache_max_itens) if config.cache_arquivo else None
+        # Limitador e circuit breaker compartilhados por todas as chamadas à Shopee
+        self.limitador_shopee = LimitadorTaxa(taxa=config.shopee_taxa, rajada=max(1, int(config.shopee_taxa * 2)), taxa_max=config.shopee_taxa * 4)
+        self.disjuntor_shopee = DisjuntorCircuito()
+        self.shopee_api = ShopeeAPI(config.shopee_app_id, config.shopee_secret, cache=self.cache_links, max_lote=config.lote_max_links,
+                                    limitador=self.limitador_shopee, disjuntor=self.disjuntor_shopee, max_tentativas=config.shopee_tentativas)
+        self.agrupador_links = AgrupadorLinks(self.shopee_api, config.janela_lote, config.lote_max_links)
+
+class Aplicacao(Conversor):
+    """Monta o bot a partir da configuração; importar o módulo não cria nem conecta nada.
+
+    Só PALAVRAS_CHAVE, PALAVRAS_BLOQUEADAS, SUBSTITUICOES e as regras dos destinos são recarregadas
+    em execução; o resto da configuração exige reiniciar.
+    """
+    def __init__(self, config: Configuracao, arquivo_config: str = '', sessao: Optional[str] = 'session_cupons', ouvir: bool = True,
+                 ambiente_inicial: Optional[Dict[str, str]] = None):
+        super().__init__(config)
+        self.config: Configuracao = config
+        self.arquivo_config = arquivo_config
+        # Ambiente de antes do .env e chaves que vieram do arquivo: uma linha apagada volta ao valor original
+        self.ambiente_inicial = dict(os.environ if ambiente_inicial is None else ambiente_inicial)
+        self._chaves_arquivo = set(dotenv_values(arquivo_config)) if arquivo_config else set()
+        # Fila para o processo supervisor; None envia daqui mesmo
+        self.saida = None
+        self._mtime_config = self._ler_mtime()
+        self.indice_duplicatas = IndiceDuplicatas(config.dedup_janela, config.dedup_max_itens, config.dedup_distancia,
+                                                  config.dedup_arquivo, config.dedup_salvar_a_cada) if config.dedup_ativo else None
+        self.fila_persistente = FilaPersistente(config.fila_arquivo) if config.fila_arquivo else None
+        self.mapeamento = MapeamentoMensagens(config.mapeamento_arquivo) if config.mapeamento_arquivo else None
+        self.fila_reprocessamento = FilaReprocessamento(config.reprocessar_tentativas, config.reprocessar_atraso)
+        # (canal, primeiro id) das mensagens no pipeline ou adiadas
+        self.em_andamento: set[tuple[int, int]] = set()
+        self.agendador_envio = AgendadorEnvio(config.envio_max_por_minuto)
+        self.pipeline = PipelineMensagens(converter_mensagem, enviar_mensagem, config.workers_conversao, config.tamanho_fila)
+        self.analisador = AnalisadorMensagens(config.processos_analise)
+        self.client = TelegramClient(sessao, config.api_id, config.api_hash)
+        if ouvir:
+            self.client.add_event_handler(handler, events.NewMessage(chats=config.canais_origem))
+            self.client.add_event_handler(handler_album, events.Album(chats=config.canais_origem))
+            if self.mapeamento:
+                self.client.add_event_handler(handler_edicao, events.MessageEdited(chats=config.canais_origem))
+        self._registrar_coletores()
+
+    def _registrar_coletores(self):
+        # Filas e estatísticas lidas só quando as métricas são exportadas
+        metricas.registrar_coletor(self.pipeline.metricas)
+        metricas.registrar_coletor(self.agendador_envio.metricas)
+        metricas.registrar_coletor(lambda: {'reprocessamento_pendentes': self.fila_reprocessamento.pendentes})
+        metricas.registrar_coletor(lambda: {f'shopee_{k}': v for k, v in estatisticas_limitador(self.limitador_shopee, self.disjuntor_shopee).items()})
+        metricas.registrar_coletor(lambda: {f'cache_shortlinks_{k}': v for k, v in self.cache_shortlinks.estatisticas().items()})
+        if self.cache_links:
+            metricas.registrar_coletor(lambda: {f'cache_links_{k}': v for k, v in self.cache_links.estatisticas().items()})
+        if self.fila_persistente:
+            metricas.registrar_coletor(lambda: {f'fila_persistente_{k}': v for k, v in self.fila_persistente.estatisticas().items()})
+        if self.mapeamento:
+            metricas.registrar_coletor(lambda: {f'mapeamento_{k}': v for k, v in self.mapeamento.estatisticas().items()})
+
+    def _ler_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.arquivo_config) if self.arquivo_config else None
+        except OSError:
+            return None
 
-REGEX_SHOPEE = r'https?://(?:s\.)?shopee\.com(?:\.br)?/[^\s\)\]\"]+'
+    def _aplicar_arquivo(self):
+        """Copia o arquivo para o ambiente; chaves que saíram do arquivo voltam ao valor de antes dele (ou somem)."""
+        valores = {chave: valor for chave, valor in dotenv_values(self.arquivo_config).items() if valor is not None}
+        for chave in self._chaves_arquivo - valores.keys():
+            if chave in self.ambiente_inicial:
+                os.environ[chave] = self.ambiente_inicial[chave]
+            else:
+                os.environ.pop(chave, None)
+        os.environ.update(valores)
+        self._chaves_arquivo = set(valores)
 
-client = TelegramClient('session_cupons', config.api_id, config.api_hash)
+    def recarregar_regras(self) -> bool:
+        """Relê o .env e troca filtros e substituições de uma vez, sem mexer na conexão nem nas filas."""
+        try:
+            if self.arquivo_config:
+                self._aplicar_arquivo()
+            nova = Configuracao()
+        except Exception as e:
+            log.error(f"Configuração inválida, mantendo a anterior: {e}")
+            return False
+        # Os destinos novos já chegam com filtros compilados; a troca da lista é uma atribuição só,
+        # então cada mensagem vê as regras antigas ou as novas, nunca uma mistura
+        self.config.palavras_chave = nova.palavras_chave
+        self.config.palavras_bloqueadas = nova.palavras_bloqueadas
+        self.config.substituicoes = nova.substituicoes
+        self.config.destinos = nova.destinos
+        log.info(f"Regras recarregadas: {nova.destinos}")
+        return True
 
-async def substituir_links_shopee(texto):
-    links = re.findall(REGEX_SHOPEE, texto)
-    if links:
-        print(f"[INFO] Link(s) Shopee original(is) encontrado(s): {links}")
-    for link in links:
+    async def vigiar_config(self):
+        """Recarrega as regras quando o arquivo de configuração muda."""
+        if not self.arquivo_config or self.config.config_intervalo <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.config.config_intervalo)
+            mtime = self._ler_mtime()
+            if mtime != self._mtime_config:
+                self._mtime_config = mtime
+                self.recarregar_regras()
+
+# No converter_lote.py é só um Conversor
+app: Optional[Aplicacao] = None
+
+def carregar_config(arquivo_config: Optional[str] = None) -> tuple[str, Dict[str, str]]:
+    """Carrega o .env (ou CONFIG_ARQUIVO) no ambiente; retorna o arquivo e o ambiente de antes dele.
+
+    O arquivo prevalece sobre variáveis já definidas, como na recarga: um `touch` no .env nunca
+    muda o valor em uso.
+    """
+    if arquivo_config is None:
+        arquivo_config = os.getenv('CONFIG_ARQUIVO') or find_dotenv()
+    ambiente_inicial = dict(os.environ)
+    if arquivo_config:
+        load_dotenv(arquivo_config, override=True)
+    return arquivo_config, ambiente_inicial
+
+def criar_conversor(arquivo_config: Optional[str] = None) -> Conversor:
+    """Monta só a conversão de links, para uso sem Telegram (converter_lote.py).
+
+    Lê apenas SHOPEE_*, SUB_IDS, cache e lotes: não exige API_ID nem canais, e não cria cliente do
+    Telegram, fila persistente nem mapeamento.
+    """
+    global app
+    carregar_config(arquivo_config)
+    app = Conversor(ConfiguracaoConversao())
+    return app
+
+def criar_aplicacao(arquivo_config: Optional[str] = None, sessao: Optional[str] = 'session_cupons',
+                    canais: Optional[list[str]] = None, ouvir: Optional[bool] = None) -> Aplicacao:
+    """Carrega o .env (ou CONFIG_ARQUIVO), valida a configuração e monta a aplicação.
+
+    `canais` restringe os canais de origem (processos ouvintes do modo supervisor); por padrão
+    o cliente só escuta os canais quando não há supervisor. `sessao=None` mantém a sessão do
+    Telegram só em memória.
+    """
+    global app
+    arquivo_config, ambiente_inicial = carregar_config(arquivo_config)
+    config = Configuracao()
+    if canais is not None:
+        config.canais_origem = canais
+    if ouvir is None:
+        ouvir = config.supervisor_processos <= 1
+    app = Aplicacao(config, arquivo_config, sessao, ouvir, ambiente_inicial)
+    return app
+
+async def resolver_link(link: str, semaforo: asyncio.Semaphore) -> Optional[str]:
+    """Expande (se for shortlink) e normaliza o link; None se não for um link Shopee."""
+    async with semaforo:
         # Se for shortlink, expanda antes de converter
-        if 's.shopee.com.br' in link:
-            link_expandido = expandir_shortlink(link)
-            url_para_converter = link_expandido
+        if e_shortlink(link):
+            url_para_converter = await expandir_shortlink(link)
         else:
             url_para_converter = link
-        if is_shopee_url(url_para_converter):
-            novo_link = shopee_api.gen_link(url_para_converter)
-            if novo_link:
-                print(f"[OK] Link convertido: {novo_link}")
-                texto = texto.replace(link, novo_link)
-            else:
-                print(f"[ERRO] Falha ao converter o link: {url_para_converter}")
+    if not is_shopee_url(url_para_converter):
+        log.warning(f"URL não reconhecida como Shopee: {url_para_converter}")
+        return None
+    return normalizar_url_shopee(url_para_converter)
+
+async def converter_link(url: Optional[str], sub_ids: tuple[str, ...], temporarias: Optional[set[str]] = None) -> Optional[str]:
+    """Converte um link já resolvido; a conversão entra no lote do agrupador."""
+    if url is None:
+        return None
+    with metricas.medir('converter'):
+        novo_link = await app.agrupador_links.converter(url, list(sub_ids), temporarias)
+    if novo_link:
+        metricas.incrementar('conversoes')
+        log.debug(f"Link convertido: {novo_link}")
+    else:
+        metricas.incrementar('conversoes_falhas')
+        log.warning(f"Falha ao converter o link: {url}")
+    return novo_link
+
+async def substituir_links_por_sub_ids(texto, grupos_sub_ids: list[tuple[str, ...]], limite: Optional[int] = None,
+                                       deduplicar: Optional[bool] = None, falhas: Optional[list[str]] = None,
+                                       conversoes: Optional[Dict[tuple[str, ...], Dict[str, str]]] = None,
+                                       conhecidas: Optional[Dict[tuple[str, ...], Dict[str, str]]] = None) -> Dict[tuple[str, ...], str]:
+    """Converte os links uma vez por (URL, sub_ids) e devolve o texto final de cada grupo de sub_ids.
+
+    `falhas` recebe só os links que ficaram sem conversão por uma falha temporária (limite, rede,
+    circuit breaker); um link inválido ou que não é da Shopee fica como está. `conversoes` recebe,
+    por grupo, link original -> link convertido; links presentes em `conhecidas` (de uma versão
+    anterior da mensagem) são reaproveitados sem chamada de rede.
+    """
+    if limite is None: limite = app.config.limite_conversoes
+    if deduplicar is None: deduplicar = app.config.deduplicar_links
+    conhecidas = conhecidas or {}
+    grupos_sub_ids = list(dict.fromkeys(grupos_sub_ids))
+    links = extrair_links_shopee(texto)
+    if not links:
+        if conversoes is not None:
+            conversoes.update({sub_ids: {} for sub_ids in grupos_sub_ids})
+        return {sub_ids: texto for sub_ids in grupos_sub_ids}
+    urls = [link.url for link in links]
+    log.debug(f"Link(s) Shopee original(is) encontrado(s): {urls}")
+    # Com deduplicação, cada link repetido na mensagem é pedido uma vez só (sem ela, o agrupador e
+    # o cache ainda fazem uma única chamada de rede por link)
+    a_converter = list(dict.fromkeys(urls)) if deduplicar else urls
+    # `limite` vale só para a expansão de shortlinks; as conversões vão juntas no lote do agrupador
+    semaforo = asyncio.Semaphore(max(1, limite))
+    # Shortlinks são expandidos uma vez só, qualquer que seja o número de grupos de sub_ids
+    pendentes = [url for url in dict.fromkeys(a_converter) if any(url not in conhecidas.get(s, {}) for s in grupos_sub_ids)]
+    resolvidos = dict(zip(pendentes, await asyncio.gather(*(resolver_link(url, semaforo) for url in pendentes))))
+    temporarias: set[str] = set()
+    async def converter(url: str, sub_ids: tuple[str, ...]) -> Optional[str]:
+        return conhecidas.get(sub_ids, {}).get(url) or await converter_link(resolvidos[url], sub_ids, temporarias)
+    por_grupo = await asyncio.gather(*(asyncio.gather(*(converter(url, sub_ids) for url in a_converter))
+                                       for sub_ids in grupos_sub_ids))
+    textos = {}
+    for sub_ids, resultados in zip(grupos_sub_ids, por_grupo):
+        if deduplicar:
+            convertidos = dict(zip(a_converter, resultados))
+            novos = [convertidos[url] for url in urls]
         else:
-            print(f"[ERRO] URL não reconhecida como Shopee: {url_para_converter}")
-    return texto
+            novos = resultados
+        if falhas is not None:
+            falhas.extend(url for url, novo in zip(a_converter, resultados) if not novo and resolvidos.get(url) in temporarias)
+        if conversoes is not None:
+            conversoes[sub_ids] = {url: novo for url, novo in zip(a_converter, resultados) if novo}
+        # Reconstrói o texto pelas posições: um link que é prefixo de outro não é corrompido
+        textos[sub_ids] = reconstruir_texto(texto, links, novos)
+    return textos
+
+async def substituir_links_shopee(texto, limite: Optional[int] = None, deduplicar: Optional[bool] = None,
+                                  falhas: Optional[list[str]] = None, sub_ids: Optional[list[str]] = None):
+    chave = tuple(sub_ids or SUB_IDS_PADRAO)
+    return (await substituir_links_por_sub_ids(texto, [chave], limite, deduplicar, falhas))[chave]
+
+class FilaReprocessamento:
+    """Fila de mensagens cujos links não foram convertidos; cada uma é reprocessada com backoff."""
+    def __init__(self, max_tentativas: int = 5, atraso_base: float = 30.0):
+        self.max_tentativas = max_tentativas
+        self.atraso_base = atraso_base
+        self._tarefas: set[asyncio.Task] = set()
+    @property
+    def pendentes(self) -> int:
+        return len(self._tarefas)
+    def agendar(self, processar, mensagem, tentativa: int) -> bool:
+        """Agenda `processar(mensagem, tentativa + 1)`; retorna False se as tentativas acabaram."""
+        if tentativa >= self.max_tentativas:
+            return False
+        tarefa = asyncio.ensure_future(self._reprocessar(processar, mensagem, tentativa + 1))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+        return True
+    async def parar(self):
+        for tarefa in list(self._tarefas):
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas.clear()
+    async def _reprocessar(self, processar, mensagem, tentativa: int):
+        await asyncio.sleep(self.atraso_base * 2 ** (tentativa - 1) * random.uniform(0.8, 1.2))
+        try:
+            await processar(mensagem, tentativa)
+        except Exception as e:
+            log.error(f"Falha ao reprocessar mensagem: {e}")
 
-@client.on(events.NewMessage(chats=config.canais_origem))
 async def handler(event):
     mensagem = event.message
-    texto = mensagem.text or mensagem.message or ''
+    # Partes de álbum chegam todas juntas pelo handler_album
+    if mensagem.grouped_id:
+        return
+    await receber_mensagem(event.chat_id, mensagem)
+
+async def handler_album(event):
+    await receber_mensagem(event.chat_id, list(event.messages))
+
+def obter_texto(mensagem) -> str:
+    """Texto da mensagem; em álbuns (lista de mensagens) é a legenda de quem tiver uma."""
+    if isinstance(mensagem, list):
+        return next((m.text or m.message for m in mensagem if m.text or m.message), '')
+    return mensagem.text or mensagem.message or ''
+
+def textos_por_parte(mensagem) -> Dict[int, str]:
+    """Texto de cada mensagem pelo id; em álbuns as partes sem legenda ficam com ''."""
+    partes = mensagem if isinstance(mensagem, list) else [mensagem]
+    return {m.id: m.text or m.message or '' for m in partes}
+
+def ids_mensagem(mensagem) -> list[int]:
+    return [m.id for m in mensagem] if isinstance(mensagem, list) else [mensagem.id]
+
+def concluir_mensagem(chat_id, mensagem):
+    concluir_ids(chat_id, ids_mensagem(mensagem))
+
+def concluir_ids(chat_id, ids: list[int]):
+    """Registra no disco que a mensagem terminou (enviada ou descartada) e avança o progresso do canal."""
+    app.em_andamento.discard((chat_id, ids[0]))
+    if app.fila_persistente:
+        app.fila_persistente.concluir(chat_id, ids[0], max(ids))
+
+async def entrar_no_pipeline(chat_id, mensagem, destinos: list[Destino]):
+    """Entrada do pipeline: espera vaga na fila se os workers estiverem atrasados.
+
+    Uma mensagem ainda na fila, em conversão ou adiada não entra de novo: a recuperação de pendentes
+    (e a de um ouvinte reiniciado, no supervisor) reentrega o que ainda não terminou.
+    """
+    chave = (chat_id, ids_mensagem(mensagem)[0])
+    if chave in app.em_andamento:
+        log.debug(f"Mensagem {chave} já está em andamento, ignorada")
+        return
+    app.em_andamento.add(chave)
+    await app.pipeline.receber(chat_id, (chat_id, mensagem, destinos))
+
+async def parar_pipeline():
+    """Descarta o que está em andamento (filas, workers e mensagens adiadas).
+
+    O que não terminou continua pendente na fila persistente e a recuperação entrega uma vez só.
+    """
+    await app.pipeline.parar()
+    await app.fila_reprocessamento.parar()
+    app.em_andamento.clear()
+
+async def receber_mensagem(chat_id, mensagem, recuperando: bool = False):
+    # Registra antes de qualquer trabalho; mensagem já registrada (backfill + evento ao vivo) é ignorada
+    if app.fila_persistente and not recuperando and not app.fila_persistente.registrar(chat_id, ids_mensagem(mensagem)[0]):
+        return
+    metricas.incrementar('mensagens_recebidas')
+    texto = obter_texto(mensagem)
     
     # Verificar se a mensagem contém links Shopee
-    #links_shopee = re.findall(REGEX_SHOPEE, texto)
+    #links_shopee = extrair_links_shopee(texto)
     #if not links_shopee:
         #print(f"[IGNORADO] Mensagem sem links Shopee: {texto[:50]}...")
         #return
     
-    # Verificar palavras-chave (se configuradas)
-    if config.palavras_chave:
-        if not any(p in texto.lower() for p in config.palavras_chave):
-            return
+    # Cada destino aplica o próprio filtro (palavras-chave e bloqueadas em uma única passada);
+    # a impressão digital sai junto, já que pode rodar em outro processo
+    # (na recuperação a impressão já foi registrada na primeira passagem)
+    todos_destinos = app.config.destinos
+    with metricas.medir('filtro'):
+        analises, impressao = await app.analisador.analisar(texto, todos_destinos, obter_id_media(mensagem),
+                                                            not recuperando and app.indice_duplicatas is not None)
+    destinos = []
+    for destino, (tem_chave, bloqueada) in zip(todos_destinos, analises):
+        # Verificar palavras-chave (se configuradas)
+        if destino.palavras_chave and not tem_chave:
+            continue
+        # Verificar palavras bloqueadas
+        if bloqueada:
+            metricas.incrementar('bloqueadas')
+            log.info(f"[BLOQUEADO] Mensagem bloqueada para {destino.nome} por conter palavra proibida: {texto[:50]}...")
+            continue
+        destinos.append(destino)
+    if not destinos:
+        concluir_mensagem(chat_id, mensagem)
+        return
     
-    # Verificar palavras bloqueadas
-    if config.palavras_bloqueadas:
-        if any(p in texto.lower() for p in config.palavras_bloqueadas):
-            print(f"[BLOQUEADO] Mensagem bloqueada por conter palavra proibida: {texto[:50]}...")
+    # Mesma oferta já vista em outro canal: descarta antes de qualquer chamada de rede
+    if impressao is not None:
+        destinos = descartar_duplicadas(impressao, destinos, texto)
+        if not destinos:
+            concluir_mensagem(chat_id, mensagem)
             return
     
-    # Substituir links Shopee
-    texto_modificado = await substituir_links_shopee(texto)
-    # Substituir palavras específicas
-    texto_modificado = substituir_palavras_especificas(texto_modificado, config.substituicoes)
-    if mensagem.media:
-        await client.send_file(config.canal_destino, mensagem.media, caption=texto_modificado)
-        print(f"[OK] Mensagem com mídia encaminhada para {config.canal_destino}")
-    else:
-        await client.send_message(config.canal_destino, texto_modificado)
-        print(f"[OK] Mensagem de texto encaminhada para {config.canal_destino}")
+    if app.saida is not None:
+        # Modo supervisor: conversão e envio ficam no supervisor, com um único limitador,
+        # agrupador de lotes e cache para os canais de todos os ouvintes
+        await repassar_ao_supervisor('mensagem', chat_id, copiar_mensagem(mensagem), [d.canal for d in destinos])
+        return
+    await entrar_no_pipeline(chat_id, mensagem, destinos)
+
+def descartar_duplicadas(impressao, destinos: list[Destino], texto: str) -> list[Destino]:
+    """Registra a oferta e retorna só os destinos que ainda não a receberam (cada um tem o próprio filtro)."""
+    novos = [d for d in destinos if not app.indice_duplicatas.verificar_e_registrar(impressao, escopo=d.canal)]
+    for destino in destinos:
+        if destino not in novos:
+            metricas.incrementar('duplicadas')
+            log.info(f"[DUPLICADA] Oferta já encaminhada recentemente para {destino.nome}: {texto[:50]}...")
+    return novos
+
+async def repassar_ao_supervisor(*dados):
+    await asyncio.get_running_loop().run_in_executor(None, app.saida.put, dados)
+
+class MensagemCopiada(NamedTuple):
+    """Os campos de uma Message do Telethon que o bot usa, para levar a mensagem a outro processo."""
+    id: int
+    text: Optional[str]
+    message: Optional[str]
+    media: object
+    photo: object
+    document: object
+    grouped_id: Optional[int]
+
+def copiar_mensagem(mensagem):
+    if isinstance(mensagem, list):
+        return [copiar_mensagem(m) for m in mensagem]
+    return MensagemCopiada(mensagem.id, mensagem.text, mensagem.message, mensagem.media, mensagem.photo,
+                           mensagem.document, mensagem.grouped_id)
+
+def obter_id_media(mensagem) -> Optional[str]:
+    """Id da foto/documento; repostagens copiadas de outro canal reaproveitam o mesmo arquivo."""
+    if isinstance(mensagem, list):
+        return obter_id_media(mensagem[0])
+    if mensagem.photo:
+        return f"foto:{mensagem.photo.id}"
+    if mensagem.document:
+        return f"doc:{mensagem.document.id}"
+    return None
+
+async def converter_mensagem(item, tentativa: int = 0) -> Optional[list[tuple[Destino, str, Dict[str, str]]]]:
+    """Estágio de conversão: retorna o texto final e os links convertidos de cada destino, ou None se a mensagem foi adiada."""
+    _, mensagem, destinos = item
+    texto = obter_texto(mensagem)
+    # Substituir links Shopee: uma conversão por (URL, sub_ids), compartilhada entre destinos
+    falhas: list[str] = []
+    conversoes: Dict[tuple[str, ...], Dict[str, str]] = {}
+    with metricas.medir('substituir'):
+        textos = await substituir_links_por_sub_ids(texto, [d.sub_ids for d in destinos], falhas=falhas, conversoes=conversoes)
+    if falhas and app.fila_reprocessamento.agendar(reprocessar_mensagem, item, tentativa):
+        metricas.incrementar('adiadas')
+        log.info(f"{len(falhas)} link(s) sem conversão, mensagem adiada (tentativa {tentativa + 1}/{app.fila_reprocessamento.max_tentativas})")
+        return None
+    resultados = []
+    for destino in destinos:
+        # Substituir palavras específicas
+        texto_modificado, substituidas = destino.substituidor.substituir(textos[destino.sub_ids])
+        if substituidas:
+            log.debug(f"{substituidas} substituição(ões) de palavras aplicada(s) para {destino.nome}")
+        resultados.append((destino, texto_modificado, conversoes[destino.sub_ids]))
+    return resultados
+
+async def enviar_mensagem(item, resultados: list[tuple[Destino, str, Dict[str, str]]]):
+    """Envia pelo agendador; a mídia original é reaproveitada por referência, sem novo upload."""
+    chat_id, mensagem, _ = item
+    envios = [(destino.canal, texto_modificado, destino.sub_ids, conversoes) for destino, texto_modificado, conversoes in resultados]
+    await enviar_envios(chat_id, textos_por_parte(mensagem), midia_para_envio(mensagem), envios)
+
+def midia_para_envio(mensagem):
+    """Mídia a reenviar: lista (álbum), a mídia da mensagem ou None para enviar só o texto."""
+    if isinstance(mensagem, list):
+        return [m.media for m in mensagem]
+    if mensagem.media and not isinstance(mensagem.media, MessageMediaWebPage):
+        return mensagem.media
+    # Prévia de link (webpage) não é arquivo: o Telegram gera a prévia de novo a partir do texto
+    return None
+
+async def enviar_envios(chat_id, textos_origem: Dict[int, str], midia,
+                        envios: list[tuple[str, str, tuple[str, ...], Dict[str, str]]]):
+    ids = list(textos_origem)
+    # Todos os destinos entram na fila do agendador antes do primeiro await: cada destino recebe na
+    # ordem de chegada, e um FloodWait em um destino não atrasa os outros
+    futuros = [agendar_para_destino(midia, canal, texto_modificado) for canal, texto_modificado, _, _ in envios]
+    for (canal, texto_modificado, sub_ids, conversoes), futuro in zip(envios, futuros):
+        try:
+            with metricas.medir('envio'):
+                enviada = await futuro
+            metricas.incrementar('enviadas')
+            if isinstance(midia, list):
+                log.info(f"[OK] Álbum com {len(midia)} mídia(s) encaminhado para {canal}")
+            elif midia is not None:
+                log.info(f"[OK] Mensagem com mídia encaminhada para {canal}")
+            else:
+                log.info(f"[OK] Mensagem de texto encaminhada para {canal}")
+            # Álbuns: a legenda (o que a edição altera) fica na primeira mensagem enviada
+            msg_destino = getattr(enviada[0] if isinstance(enviada, list) else enviada, 'id', None)
+            if app.mapeamento and msg_destino:
+                app.mapeamento.salvar(chat_id, textos_origem, canal, msg_destino, sub_ids, conversoes)
+        except Exception as e:
+            metricas.incrementar('envios_falhas')
+            log.error(f"Falha ao enviar para {canal}: {e}")
+    concluir_ids(chat_id, ids)
+
+def agendar_para_destino(midia, canal: str, texto_modificado: str) -> asyncio.Future:
+    """Põe o envio na fila do destino sem esperar; o futuro dá a mensagem enviada (uma lista, no caso de álbum)."""
+    if midia is not None:
+        # Álbum inteiro (ou a mídia única) em um único send_file, legenda no primeiro item
+        return app.agendador_envio.agendar(canal, lambda: app.client.send_file(canal, midia, caption=texto_modificado))
+    return app.agendador_envio.agendar(canal, lambda: app.client.send_message(canal, texto_modificado))
+
+async def handler_edicao(event):
+    mensagem = event.message
+    if app.saida is not None:
+        await repassar_ao_supervisor('edicao', event.chat_id, mensagem.id, obter_texto(mensagem))
+        return
+    await propagar_edicao(event.chat_id, mensagem.id, obter_texto(mensagem))
+
+async def propagar_edicao(chat_id, msg_id: int, texto: str):
+    """Propaga a edição de uma mensagem já encaminhada; só os links que mudaram são convertidos."""
+    # Edições que não mudam o texto (reações, botões) e mensagens nunca encaminhadas são ignoradas
+    registros = [r for r in app.mapeamento.buscar(chat_id, msg_id) if r.texto_origem != texto]
+    if not registros:
+        return
+    conversoes: Dict[tuple[str, ...], Dict[str, str]] = {}
+    with metricas.medir('editar'):
+        textos = await substituir_links_por_sub_ids(texto, [r.sub_ids for r in registros], conversoes=conversoes,
+                                                    conhecidas={r.sub_ids: r.conversoes for r in registros})
+    destinos = {destino.canal: destino for destino in app.config.destinos}
+    for registro in registros:
+        texto_modificado = textos[registro.sub_ids]
+        destino = destinos.get(registro.canal_destino)
+        if destino:
+            if destino.filtro.analisar(texto)[1]:
+                log.info(f"[BLOQUEADO] Edição não propagada para {destino.nome} por conter palavra proibida: {texto[:50]}...")
+                continue
+            texto_modificado, _ = destino.substituidor.substituir(texto_modificado)
+        await editar_destino(chat_id, msg_id, registro.canal_destino, registro.msg_destino, texto, texto_modificado,
+                             conversoes[registro.sub_ids])
+
+async def editar_destino(chat_id, msg_id: int, canal: str, msg_destino: int, texto_origem: str,
+                         texto_modificado: str, conversoes: Dict[str, str]):
+    try:
+        await app.agendador_envio.enviar(canal, lambda: app.client.edit_message(canal, msg_destino, texto_modificado))
+        metricas.incrementar('edicoes')
+        log.info(f"[OK] Edição propagada para {canal}")
+    except errors.MessageNotModifiedError:
+        pass
+    except Exception as e:
+        metricas.incrementar('edicoes_falhas')
+        log.error(f"Falha ao editar mensagem em {canal}: {e}")
+        return
+    app.mapeamento.atualizar(chat_id, msg_id, canal, texto_origem, conversoes)
+
+async def reprocessar_mensagem(item, tentativa: int):
+    # Mensagens adiadas já perderam a vez na ordem do canal e são enviadas assim que convertidas
+    resultados = await converter_mensagem(item, tentativa)
+    if resultados is not None:
+        await enviar_mensagem(item, resultados)
+
+async def buscar_mensagem(chat_id, msg_id):
+    """Busca uma mensagem pendente; se for parte de um álbum, devolve o álbum inteiro."""
+    mensagem = await app.client.get_messages(chat_id, ids=msg_id)
+    if mensagem is None or not mensagem.grouped_id:
+        return mensagem
+    vizinhas = await app.client.get_messages(chat_id, ids=list(range(msg_id, msg_id + 10)))
+    return [m for m in vizinhas if m is not None and m.grouped_id == mensagem.grouped_id]
+
+async def agrupar_albuns(mensagens):
+    """Junta partes consecutivas do mesmo álbum (grouped_id) vindas de iter_messages."""
+    album = []
+    async for mensagem in mensagens:
+        if album and mensagem.grouped_id != album[0].grouped_id:
+            yield album
+            album = []
+        if mensagem.grouped_id:
+            album.append(mensagem)
+        else:
+            yield mensagem
+    if album:
+        yield album
+
+async def recuperar_mensagens():
+    """Reprocessa o que ficou pendente e busca, em lote e com ritmo limitado, o que chegou com o bot parado."""
+    if not app.fila_persistente:
+        return
+    try:
+        # A fila pode ser compartilhada com outros processos ouvintes: cada um só recupera os próprios canais
+        entidades = {canal: await app.client.get_input_entity(canal) for canal in app.config.canais_origem}
+        meus_chats = {utils.get_peer_id(entidade) for entidade in entidades.values()}
+        pendentes = [(chat_id, msg_id) for chat_id, msg_id in app.fila_persistente.pendentes() if chat_id in meus_chats]
+        if pendentes:
+            log.info(f"Reprocessando {len(pendentes)} mensagem(ns) pendente(s)")
+        for chat_id, msg_id in pendentes:
+            mensagem = await buscar_mensagem(chat_id, msg_id)
+            if not mensagem:
+                app.fila_persistente.concluir(chat_id, msg_id)
+                continue
+            await receber_mensagem(chat_id, mensagem, recuperando=True)
+        for canal, entidade in entidades.items():
+            chat_id = utils.get_peer_id(entidade)
+            ultimo_id = app.fila_persistente.ultimo_id(chat_id)
+            if not ultimo_id:
+                # Primeira execução neste canal: não há ponto de partida para recuperar
+                continue
+            recuperadas = 0
+            async for item in agrupar_albuns(app.client.iter_messages(entidade, min_id=ultimo_id, reverse=True, limit=app.config.backfill_max)):
+                await receber_mensagem(chat_id, item)
+                recuperadas += 1
+                await asyncio.sleep(1 / app.config.backfill_taxa)
+            if recuperadas:
+                log.info(f"{recuperadas} mensagem(ns) recuperada(s) de {canal}")
+    except Exception as e:
+        log.error(f"Falha na recuperação de mensagens: {e}")
+
+async def iniciar_metricas():
+    if app.config.metricas_porta:
+        await metricas.iniciar_servidor(app.config.metricas_porta)
+    if app.config.metricas_intervalo > 0:
+        metricas.iniciar_resumo(app.config.metricas_intervalo)
 
 def iniciar_bot():
+    if app is None:
+        criar_aplicacao()
+    configurar_logs(app.config.log_nivel)
+    if app.config.supervisor_processos > 1:
+        import supervisor
+        supervisor.iniciar_supervisor()
+        return
     while True:
         try:
-            print("Bot de Cupons iniciado. Monitorando mensagens...")
-            print(f"Canais de origem: {config.canais_origem}")
-            print(f"Canal de destino: {config.canal_destino}")
-            if config.substituicoes:
-                print(f"Substituições configuradas: {config.substituicoes}")
-            with client:
-                client.run_until_disconnected()
+            log.info("Bot de Cupons iniciado. Monitorando mensagens...")
+            log.info(f"Canais de origem: {app.config.canais_origem}")
+            log.info(f"Destinos: {app.config.destinos}")
+            for destino in app.config.destinos:
+                if destino.substituicoes:
+                    log.info(f"Substituições configuradas ({destino.nome}): {destino.substituicoes}")
+            with app.client:
+                recuperacao = vigia = None
+                try:
+                    app.client.loop.run_until_complete(app.pipeline.iniciar())
+                    app.client.loop.run_until_complete(iniciar_metricas())
+                    recuperacao = app.client.loop.create_task(recuperar_mensagens())
+                    vigia = app.client.loop.create_task(app.vigiar_config())
+                    if hasattr(signal, 'SIGHUP'):
+                        app.client.loop.add_signal_handler(signal.SIGHUP, app.recarregar_regras)
+                    app.client.run_until_disconnected()
+                finally:
+                    for tarefa in (recuperacao, vigia):
+                        if tarefa:
+                            tarefa.cancel()
+                    app.client.loop.run_until_complete(parar_pipeline())
+                    app.client.loop.run_until_complete(app.agendador_envio.parar())
+                    app.client.loop.run_until_complete(metricas.parar())
+                    log.info(f"Métricas: {metricas.resumo()}")
+                    if app.indice_duplicatas:
+                        app.indice_duplicatas.salvar()
+                        log.info(f"Duplicatas: {app.indice_duplicatas.estatisticas()}")
+                    app.client.loop.run_until_complete(fechar_sessao_http())
+                    log.info(f"Shopee: {estatisticas_limitador(app.limitador_shopee, app.disjuntor_shopee)}")
         except Exception as e:
-            print(f"[ERRO] O bot parou devido a: {e}")
-            print("Tentando reiniciar em 10 segundos...")
+            log.error(f"O bot parou devido a: {e}")
+            log.info("Tentando reiniciar em 10 segundos...")
             time.sleep(10)
 
 if __name__ == '__main__':
-    iniciar_bot() 
+    # Importa pelo nome: o modo supervisor e os processos filhos usam o módulo bot_cupons, não __main__
+    import bot_cupons
+    bot_cupons.iniciar_bot()
+
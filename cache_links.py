@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Caches do bot: links de afiliado persistentes (SQLite, TTL + LRU) e LRU em memória
+"""
+
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Inserções entre recontagens do tamanho real da tabela
+RECONTAR_A_CADA = 100
+
+class CacheLinks:
+    """Cache persistente de links convertidos com TTL e limite de itens (LRU pelo último acesso).
+
+    Outros processos (converter_lote.py, o benchmark) podem escrever no mesmo arquivo, então o tamanho
+    é recontado no banco a cada RECONTAR_A_CADA inserções e antes de despejar: CACHE_LINKS_MAX vale
+    para o arquivo, não para cada processo.
+    """
+    def __init__(self, arquivo: str = 'cache_links.db', ttl: float = 7 * 24 * 3600, max_itens: int = 50000):
+        self.arquivo = arquivo
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+        self._conn = sqlite3.connect(arquivo)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS links (
+            chave TEXT PRIMARY KEY,
+            link TEXT NOT NULL,
+            criado REAL NOT NULL,
+            acessado REAL NOT NULL)''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_links_acessado ON links (acessado)')
+        self._conn.commit()
+        self._remover_expirados()
+        self._tamanho = self._contar()
+        self._insercoes = 0
+
+    def _contar(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM links').fetchone()[0]
+
+    @staticmethod
+    def gerar_chave(url_normalizada: str, sub_ids: list[str]) -> str:
+        return f"{url_normalizada}|{','.join(sub_ids)}"
+
+    def obter(self, chave: str) -> Optional[str]:
+        """Retorna o link em cache (atualizando o acesso para o LRU) ou None."""
+        agora = time.time()
+        linha = self._conn.execute('SELECT link, criado FROM links WHERE chave = ?', (chave,)).fetchone()
+        if linha is None:
+            self.falhas += 1
+            return None
+        link, criado = linha
+        if agora - criado > self.ttl:
+            self._conn.execute('DELETE FROM links WHERE chave = ?', (chave,))
+            self._conn.commit()
+            self._tamanho -= 1
+            self.falhas += 1
+            return None
+        self._conn.execute('UPDATE links SET acessado = ? WHERE chave = ?', (agora, chave))
+        self._conn.commit()
+        self.acertos += 1
+        return link
+
+    def salvar(self, chave: str, link: str):
+        agora = time.time()
+        existia = self._conn.execute('SELECT 1 FROM links WHERE chave = ?', (chave,)).fetchone() is not None
+        self._conn.execute('INSERT OR REPLACE INTO links (chave, link, criado, acessado) VALUES (?, ?, ?, ?)',
+                           (chave, link, agora, agora))
+        if not existia:
+            self._tamanho += 1
+            self._insercoes += 1
+            if self._insercoes % RECONTAR_A_CADA == 0:
+                self._tamanho = self._contar()
+        if self._tamanho > self.max_itens:
+            self._tamanho = self._contar()
+            excesso = self._tamanho - self.max_itens
+            if excesso > 0:
+                self._conn.execute('DELETE FROM links WHERE chave IN (SELECT chave FROM links ORDER BY acessado LIMIT ?)', (excesso,))
+                self._tamanho -= excesso
+                self.despejos += excesso
+        self._conn.commit()
+
+    def _remover_expirados(self):
+        self._conn.execute('DELETE FROM links WHERE criado < ?', (time.time() - self.ttl,))
+        self._conn.commit()
+
+    def estatisticas(self) -> Dict[str, float]:
+        total = self.acertos + self.falhas
+        return {
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'despejos': self.despejos,
+            'itens': self._tamanho,
+            'taxa_acerto': self.acertos / total if total else 0.0,
+        }
+
+    def fechar(self):
+        self._conn.close()
+
+class CacheMemoria:
+    """Cache LRU limitado em memória (usado para shortlinks já expandidos)."""
+    def __init__(self, max_itens: int = 10000):
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.falhas = 0
+        self._itens: OrderedDict[str, str] = OrderedDict()
+
+    def obter(self, chave: str) -> Optional[str]:
+        valor = self._itens.get(chave)
+        if valor is None:
+            self.falhas += 1
+            return None
+        self._itens.move_to_end(chave)
+        self.acertos += 1
+        return valor
+
+    def salvar(self, chave: str, valor: str):
+        self._itens[chave] = valor
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+
+    def estatisticas(self) -> Dict[str, float]:
+        return {'acertos': self.acertos, 'falhas': self.falhas, 'itens': len(self._itens)}
@@ -90,7 +90,7 @@ def mostrar_ajuda():
     print("• Para canais públicos: use @nome_do_canal")
     print("• Para canais privados: use o ID numérico (ex: -1001234567890)")
     print("• Múltiplos canais de origem: separe por vírgula (ex: @canal1,@canal2,@canal3)")
-    print("• Apenas um canal de destino é permitido")
+    print("• Apenas um CANAL_DESTINO; para vários destinos com regras próprias use DESTINOS (veja o README)")
     print("")
     print("🛒 SHOPEE APP ID e 🛡️ SHOPEE SECRET:")
     print("1. Acesse: https://open-api.affiliate.shopee.com.br/")
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Conversão em lote, sem Telegram: troca os links Shopee de uma lista de links, de mensagens ou de uma
+exportação de canal pelos links de afiliado, escrevendo o resultado à medida que fica pronto
+
+    python converter_lote.py links.txt -o convertidos.txt
+    cat mensagens.txt | python converter_lote.py - --blocos > convertidas.txt
+    python converter_lote.py result.json -o historico.jsonl --sub-ids catalogo,2024
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from typing import Iterator, Optional
+
+import bot_cupons
+from metricas import configurar_logs
+
+log = logging.getLogger('converter_lote')
+
+TAMANHO_BLOCO = 64 * 1024
+
+# Item de entrada: (chave, texto); a chave é o id da mensagem na exportação do Telegram
+Item = tuple[Optional[int], str]
+
+def texto_exportado(mensagem: dict) -> str:
+    """Texto de uma mensagem do result.json; entidades de link usam o href (o texto visível pode estar encurtado)."""
+    texto = mensagem.get('text', '')
+    if isinstance(texto, list):
+        texto = ''.join(p if isinstance(p, str) else p.get('href') or p.get('text', '') for p in texto)
+    return texto
+
+def ler_export_telegram(f) -> Iterator[Item]:
+    """Lê `messages` do result.json do Telegram Desktop uma mensagem por vez, sem carregar o arquivo inteiro."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    # Avança até o início da lista de mensagens
+    while True:
+        pos = buffer.find('"messages"')
+        inicio = buffer.find('[', pos) if pos >= 0 else -1
+        if inicio >= 0:
+            buffer = buffer[inicio + 1:]
+            break
+        bloco = f.read(TAMANHO_BLOCO)
+        if not bloco:
+            return
+        buffer = (buffer[pos:] if pos >= 0 else buffer[-len('"messages"'):]) + bloco
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            return
+        try:
+            mensagem, fim = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # Mensagem cortada no fim do bloco: lê mais e tenta de novo
+            bloco = f.read(TAMANHO_BLOCO)
+            if not bloco:
+                if buffer.strip():
+                    log.warning("Exportação terminou no meio de uma mensagem")
+                return
+            buffer += bloco
+            continue
+        buffer = buffer[fim:]
+        # Mensagens de serviço e sem texto também contam como item, para o checkpoint ser estável
+        yield mensagem.get('id'), texto_exportado(mensagem) if mensagem.get('type', 'message') == 'message' else ''
+
+def ler_linhas(f) -> Iterator[Item]:
+    for linha in f:
+        yield None, linha.rstrip('\r\n')
+
+def ler_blocos(f) -> Iterator[Item]:
+    """Mensagens separadas por linha em branco (mesmo formato do corpus do benchmark_replay)."""
+    linhas: list[str] = []
+    for linha in f:
+        linha = linha.rstrip('\r\n')
+        if linha.strip():
+            linhas.append(linha)
+        elif linhas:
+            yield None, '\n'.join(linhas)
+            linhas = []
+    if linhas:
+        yield None, '\n'.join(linhas)
+
+def formato_entrada(args) -> str:
+    if args.formato != 'auto':
+        return args.formato
+    if args.entrada.endswith('.json'):
+        return 'telegram'
+    return 'blocos' if args.blocos else 'linhas'
+
+def formatar_saida(formato: str, chave: Optional[int], texto: str) -> str:
+    if formato == 'telegram':
+        # Mensagens sem texto (fotos sem legenda, serviço) não geram linha
+        return json.dumps({'id': chave, 'texto': texto}, ensure_ascii=False) + '\n' if texto else ''
+    return texto + ('\n\n' if formato == 'blocos' else '\n')
+
+def ler_checkpoint(arquivo: str, entrada: str) -> dict:
+    try:
+        with open(arquivo, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return {'itens': 0, 'bytes_saida': 0}
+    if checkpoint.get('entrada') != entrada:
+        raise ValueError(f"O checkpoint {arquivo} é de outra entrada ({checkpoint.get('entrada')}); use --reiniciar")
+    return checkpoint
+
+def salvar_checkpoint(arquivo: str, entrada: str, itens: int, bytes_saida: int):
+    # Grava em arquivo temporário e troca: uma interrupção nunca deixa o checkpoint pela metade
+    temporario = arquivo + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump({'entrada': entrada, 'itens': itens, 'bytes_saida': bytes_saida, 'atualizado': time.time()}, f)
+    os.replace(temporario, arquivo)
+
+async def converter_item(texto: str, sub_ids: list[str], semaforo: asyncio.Semaphore) -> tuple[str, list[str]]:
+    falhas: list[str] = []
+    async with semaforo:
+        convertido = await bot_cupons.substituir_links_shopee(texto, falhas=falhas, sub_ids=sub_ids)
+    return convertido, falhas
+
+async def converter_lote(args) -> dict:
+    """Converte a entrada na ordem original com até `args.concorrencia` itens em andamento.
+
+    A memória fica limitada à janela de itens em andamento: a entrada é lida sob demanda e cada
+    resultado é escrito (e esquecido) assim que os anteriores terminam. O checkpoint guarda quantos
+    itens já estão na saída e o tamanho dela, para retomar do mesmo ponto depois de uma interrupção.
+    """
+    formato = formato_entrada(args)
+    entrada_abs = 'stdin' if args.entrada == '-' else os.path.abspath(args.entrada)
+    checkpoint = args.checkpoint or (args.saida + '.checkpoint' if args.saida else '')
+    if checkpoint and args.reiniciar and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    estado = ler_checkpoint(checkpoint, entrada_abs) if checkpoint else {'itens': 0, 'bytes_saida': 0}
+    pular = estado['itens']
+    if pular:
+        log.info(f"Retomando do checkpoint: {pular} item(ns) já convertido(s)")
+
+    f_entrada = sys.stdin if args.entrada == '-' else open(args.entrada, encoding='utf-8')
+    if args.saida:
+        if pular and os.path.exists(args.saida):
+            # Descarta o que foi escrito depois do último checkpoint; será convertido de novo
+            f_saida = open(args.saida, 'r+', encoding='utf-8')
+            f_saida.truncate(estado['bytes_saida'])
+            f_saida.seek(estado['bytes_saida'])
+        else:
+            f_saida = open(args.saida, 'w', encoding='utf-8')
+    else:
+        f_saida = sys.stdout
+    leitor = {'telegram': ler_export_telegram, 'blocos': ler_blocos}.get(formato, ler_linhas)(f_entrada)
+
+    loop = asyncio.get_running_loop()
+    semaforo = asyncio.Semaphore(max(1, args.concorrencia))
+    # Janela maior que a concorrência: um item lento no início não para os seguintes
+    janela = max(1, args.concorrencia) * 2
+    pendentes: deque = deque()
+    totais = {'itens': pular, 'itens_com_falha': 0, 'links_com_falha': 0}
+    inicio = ultimo_checkpoint = time.monotonic()
+    escritos = 0
+    concluido = False
+
+    def gravar_checkpoint():
+        if not checkpoint:
+            return
+        f_saida.flush()
+        if f_saida is not sys.stdout:
+            os.fsync(f_saida.fileno())
+        salvar_checkpoint(checkpoint, entrada_abs, totais['itens'], f_saida.tell() if f_saida is not sys.stdout else 0)
+
+    async def escrever_proximo():
+        nonlocal ultimo_checkpoint, escritos
+        chave, tarefa = pendentes.popleft()
+        convertido, falhas = await tarefa
+        f_saida.write(formatar_saida(formato, chave, convertido))
+        totais['itens'] += 1
+        escritos += 1
+        if falhas:
+            totais['itens_com_falha'] += 1
+            totais['links_com_falha'] += len(falhas)
+            log.warning(f"Link(s) não convertido(s), mantido(s) o(s) original(is): {falhas}")
+        if escritos % args.intervalo_checkpoint == 0 or time.monotonic() - ultimo_checkpoint >= 5:
+            gravar_checkpoint()
+            ultimo_checkpoint = time.monotonic()
+            log.info(f"{totais['itens']} item(ns) convertido(s) ({escritos / (ultimo_checkpoint - inicio):.1f} itens/s)")
+
+    try:
+        # Os itens já convertidos são lidos e descartados, sem chamadas à Shopee
+        for _ in range(pular):
+            if await loop.run_in_executor(None, next, leitor, None) is None:
+                break
+        while True:
+            # Leitura fora do loop: um stdin lento não trava as conversões em andamento
+            item = await loop.run_in_executor(None, next, leitor, None)
+            if item is None:
+                break
+            chave, texto = item
+            pendentes.append((chave, asyncio.ensure_future(converter_item(texto, args.sub_ids, semaforo))))
+            if len(pendentes) >= janela:
+                await escrever_proximo()
+        while pendentes:
+            await escrever_proximo()
+        concluido = True
+    finally:
+        for _, tarefa in pendentes:
+            tarefa.cancel()
+        await asyncio.gather(*(tarefa for _, tarefa in pendentes), return_exceptions=True)
+        if not concluido:
+            # Interrompido: o checkpoint fica com os itens escritos até aqui
+            gravar_checkpoint()
+        f_saida.flush()
+        if f_entrada is not sys.stdin:
+            f_entrada.close()
+        if f_saida is not sys.stdout:
+            f_saida.close()
+        await bot_cupons.fechar_sessao_http()
+    # Terminou: a próxima execução com a mesma entrada começa do zero
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    totais['duracao'] = time.monotonic() - inicio
+    return totais
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte links Shopee em lote (lista de links, mensagens ou exportação de canal)")
+    parser.add_argument('entrada', help="arquivo de entrada ou - para stdin; .json é lido como result.json do Telegram Desktop")
+    parser.add_argument('-o', '--saida', help="arquivo de saída (padrão: stdout); com arquivo, o progresso é retomável")
+    parser.add_argument('--blocos', action='store_true', help="mensagens separadas por linha em branco em vez de uma por linha")
+    parser.add_argument('--formato', choices=('auto', 'linhas', 'blocos', 'telegram'), default='auto')
+    parser.add_argument('--sub-ids', help="sub_ids separados por vírgula (padrão: SUB_IDS do .env)")
+    parser.add_argument('--concorrencia', type=int, default=20, help="itens convertidos ao mesmo tempo")
+    parser.add_argument('--taxa', type=float, default=0, help="requisições por segundo à Shopee (padrão: SHOPEE_TAXA_REQ)")
+    parser.add_argument('--checkpoint', help="arquivo de progresso (padrão: <saida>.checkpoint)")
+    parser.add_argument('--intervalo-checkpoint', type=int, default=500, help="itens entre checkpoints (também a cada 5s)")
+    parser.add_argument('--reiniciar', action='store_true', help="ignora o checkpoint e começa do início")
+    args = parser.parse_args()
+
+    # Só a conversão: sem Telegram, canais, fila persistente nem mapeamento
+    app = bot_cupons.criar_conversor()
+    configurar_logs(app.config.log_nivel)
+    args.sub_ids = bot_cupons.ler_lista(args.sub_ids, minusculas=False) if args.sub_ids else app.config.sub_ids
+    if args.taxa > 0:
+        app.limitador_shopee.taxa = args.taxa
+        app.limitador_shopee.taxa_max = args.taxa * 4
+    try:
+        totais = asyncio.run(converter_lote(args))
+    except KeyboardInterrupt:
+        log.info("Interrompido; rode o mesmo comando para continuar do checkpoint")
+        sys.exit(130)
+    log.info(f"{totais['itens']} item(ns) em {totais['duracao']:.1f}s; {totais['itens_com_falha']} com link(s) não "
+             f"convertido(s) ({totais['links_com_falha']} link(s))")
+    if app.cache_links:
+        log.info(f"Cache de links: {app.cache_links.estatisticas()}")
+
+if __name__ == '__main__':
+    main()
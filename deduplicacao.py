@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Supressão de ofertas repetidas entre canais: impressão digital da mensagem + índice com janela de tempo
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from links_shopee import extrair_links_shopee, extrair_ids_produto, normalizar_url_shopee, REGEX_SHOPEE
+
+log = logging.getLogger(__name__)
+
+REGEX_PALAVRA = re.compile(r'\w+')
+BITS_SIMHASH = 64
+# 4 faixas de 16 bits: duas impressões a até 3 bits de distância têm pelo menos uma faixa igual
+FAIXAS_SIMHASH = 4
+MIN_PALAVRAS_SIMHASH = 5
+
+class ImpressaoMensagem(NamedTuple):
+    produtos: frozenset
+    simhash: Optional[int]
+    media: Optional[str]
+
+def calcular_simhash(texto: str) -> Optional[int]:
+    """SimHash de 64 bits das palavras do texto (sem links); None para textos curtos demais."""
+    palavras = REGEX_PALAVRA.findall(REGEX_SHOPEE.sub(' ', texto).lower())
+    if len(palavras) < MIN_PALAVRAS_SIMHASH:
+        return None
+    pesos = [0] * BITS_SIMHASH
+    for palavra in palavras:
+        h = int.from_bytes(hashlib.blake2b(palavra.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(BITS_SIMHASH):
+            pesos[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, peso in enumerate(pesos) if peso > 0)
+
+def gerar_impressao(texto: str, media: Optional[str] = None) -> ImpressaoMensagem:
+    """Produtos (loja/item, ou o link normalizado quando é shortlink), SimHash do texto e id da mídia."""
+    produtos = set()
+    for link in extrair_links_shopee(texto):
+        ids = extrair_ids_produto(link.url)
+        produtos.add(f"{ids[0]}.{ids[1]}" if ids else normalizar_url_shopee(link.url))
+    return ImpressaoMensagem(frozenset(produtos), calcular_simhash(texto), media)
+
+class IndiceDuplicatas:
+    """Índice em memória das impressões recentes, com busca O(1) por chave e tamanho limitado.
+
+    Uma mensagem é duplicata se tem o mesmo conjunto de produtos, a mesma mídia ou um SimHash
+    a até `distancia` bits de alguma mensagem vista dentro da janela, no mesmo `escopo` (o canal
+    de destino: uma oferta repetida só é descartada para os destinos que já a receberam). Mídia e
+    SimHash só contam se uma das duas mensagens não tem produtos ou se os produtos são os mesmos:
+    canais de cupons reaproveitam o mesmo modelo de texto e o mesmo banner para ofertas diferentes.
+    Com `arquivo`, o índice é
+    gravado a cada `salvar_a_cada` registros ou `intervalo_salvar` segundos, para sobreviver a um
+    processo morto sem desligamento limpo.
+    """
+    def __init__(self, janela: float = 1800.0, max_itens: int = 10000, distancia: int = 3, arquivo: str = '',
+                 salvar_a_cada: int = 20, intervalo_salvar: float = 60.0):
+        self.janela = janela
+        self.max_itens = max_itens
+        self.distancia = distancia
+        self.arquivo = arquivo
+        self.salvar_a_cada = salvar_a_cada
+        self.intervalo_salvar = intervalo_salvar
+        self._nao_salvos = 0
+        self._salvo_em = time.monotonic()
+        self.duplicatas = 0
+        self.unicas = 0
+        # id -> (instante, chaves exatas, simhash, escopo, produtos); ordem de inserção = ordem de expiração
+        self._entradas: OrderedDict[int, tuple[float, list[str], Optional[int], str, list[str]]] = OrderedDict()
+        self._chaves: dict[str, set[int]] = {}
+        self._faixas: dict[tuple[str, int, int], set[int]] = {}
+        self._proximo_id = 0
+        if arquivo:
+            self.carregar()
+
+    @staticmethod
+    def _chaves_exatas(impressao: ImpressaoMensagem, escopo: str) -> list[str]:
+        chaves = []
+        if impressao.produtos:
+            chaves.append(f'{escopo}|p:' + '|'.join(sorted(impressao.produtos)))
+        if impressao.media:
+            chaves.append(f'{escopo}|m:{impressao.media}')
+        return chaves
+
+    @staticmethod
+    def _faixas_de(simhash: int, escopo: str) -> list[tuple[str, int, int]]:
+        largura = BITS_SIMHASH // FAIXAS_SIMHASH
+        return [(escopo, i, simhash >> (i * largura) & ((1 << largura) - 1)) for i in range(FAIXAS_SIMHASH)]
+
+    def _expirar(self, agora: float):
+        while self._entradas:
+            id_entrada, (instante, *_) = next(iter(self._entradas.items()))
+            if agora - instante <= self.janela and len(self._entradas) <= self.max_itens:
+                break
+            self._remover(id_entrada)
+
+    def _remover(self, id_entrada: int):
+        _, chaves, simhash, escopo, _ = self._entradas.pop(id_entrada)
+        indices = [(self._chaves, chave) for chave in chaves]
+        if simhash is not None:
+            indices += [(self._faixas, faixa) for faixa in self._faixas_de(simhash, escopo)]
+        for indice, chave in indices:
+            ids = indice.get(chave)
+            if ids:
+                ids.discard(id_entrada)
+                if not ids:
+                    del indice[chave]
+
+    def _mesma_oferta(self, produtos: frozenset, id_entrada: int) -> bool:
+        outros = self._entradas[id_entrada][4]
+        return not produtos or not outros or produtos == frozenset(outros)
+
+    def _e_duplicata(self, impressao: ImpressaoMensagem, chaves: list[str], escopo: str) -> bool:
+        # A chave de produtos já é o conjunto inteiro; a de mídia precisa conferir os produtos
+        for chave in chaves:
+            if any(self._mesma_oferta(impressao.produtos, id_entrada) for id_entrada in self._chaves.get(chave, ())):
+                return True
+        simhash = impressao.simhash
+        if simhash is None:
+            return False
+        for faixa in self._faixas_de(simhash, escopo):
+            for id_entrada in self._faixas.get(faixa, ()):
+                outro = self._entradas[id_entrada][2]
+                if bin(simhash ^ outro).count('1') <= self.distancia and self._mesma_oferta(impressao.produtos, id_entrada):
+                    return True
+        return False
+
+    def verificar_e_registrar(self, impressao: ImpressaoMensagem, agora: Optional[float] = None, escopo: str = '') -> bool:
+        """Retorna True se a mensagem é duplicata no `escopo`; caso contrário registra a impressão e retorna False."""
+        agora = time.time() if agora is None else agora
+        self._expirar(agora)
+        chaves = self._chaves_exatas(impressao, escopo)
+        if self._e_duplicata(impressao, chaves, escopo):
+            self.duplicatas += 1
+            return True
+        self.unicas += 1
+        self._registrar(agora, chaves, impressao.simhash, escopo, sorted(impressao.produtos))
+        self._expirar(agora)
+        self._nao_salvos += 1
+        if self.arquivo and (self._nao_salvos >= self.salvar_a_cada or time.monotonic() - self._salvo_em >= self.intervalo_salvar):
+            try:
+                self.salvar()
+            except OSError as e:
+                log.error(f"Falha ao salvar índice de duplicatas {self.arquivo}: {e}")
+        return False
+
+    def _registrar(self, instante: float, chaves: list[str], simhash: Optional[int], escopo: str, produtos: list[str]):
+        id_entrada = self._proximo_id
+        self._proximo_id += 1
+        self._entradas[id_entrada] = (instante, chaves, simhash, escopo, produtos)
+        for chave in chaves:
+            self._chaves.setdefault(chave, set()).add(id_entrada)
+        if simhash is not None:
+            for faixa in self._faixas_de(simhash, escopo):
+                self._faixas.setdefault(faixa, set()).add(id_entrada)
+
+    def salvar(self):
+        if not self.arquivo:
+            return
+        temporario = f"{self.arquivo}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump([list(entrada) for entrada in self._entradas.values()], f)
+        os.replace(temporario, self.arquivo)
+        self._nao_salvos = 0
+        self._salvo_em = time.monotonic()
+
+    def carregar(self):
+        if not os.path.exists(self.arquivo):
+            return
+        try:
+            with open(self.arquivo, encoding='utf-8') as f:
+                entradas = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error(f"Falha ao carregar índice de duplicatas {self.arquivo}: {e}")
+            return
+        agora = time.time()
+        for entrada in entradas:
+            # Versões anteriores gravavam 3 campos (sem escopo, que vale como '') ou 4 (sem produtos,
+            # que valem como desconhecidos e casam com qualquer oferta, como antes)
+            if len(entrada) == 3:
+                entrada = [*entrada, '']
+            if len(entrada) == 4:
+                entrada = [*entrada, []]
+            instante, chaves, simhash, escopo, produtos = entrada
+            if agora - instante <= self.janela:
+                self._registrar(instante, chaves, simhash, escopo, produtos)
+        self._expirar(agora)
+
+    def estatisticas(self) -> dict:
+        return {'itens': len(self._entradas), 'duplicatas': self.duplicatas, 'unicas': self.unicas}
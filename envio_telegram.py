@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Agendador de envios ao Telegram: ritmo limitado por destino e FloodWait tratado pausando a fila
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from telethon import errors
+
+log = logging.getLogger(__name__)
+
+class AgendadorEnvio:
+    """Uma fila por destino; cada envio espera o intervalo mínimo e, em FloodWait, a fila inteira pausa.
+
+    FloodWaits curtos já são dormidos pelo próprio Telethon (flood_sleep_threshold); os longos chegam
+    aqui como FloodWaitError e o envio é repetido depois da pausa, sem derrubar a conexão.
+    """
+    def __init__(self, max_por_minuto: float = 20, max_tentativas: int = 5):
+        self.intervalo = 60 / max_por_minuto if max_por_minuto > 0 else 0.0
+        self.max_tentativas = max_tentativas
+        self.enviados = 0
+        self.flood_waits = 0
+        self.tempo_pausado = 0.0
+        self._filas: Dict[Any, asyncio.Queue] = {}
+        self._tarefas: Dict[Any, asyncio.Task] = {}
+        self._ultimo_envio: Dict[Any, float] = {}
+
+    async def enviar(self, destino: Any, envio: Callable[[], Awaitable[Any]]) -> Any:
+        """Coloca `envio()` na fila do destino e espera ele ser executado (retorna o resultado do envio)."""
+        return await self.agendar(destino, envio)
+
+    def agendar(self, destino: Any, envio: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Coloca `envio()` na fila do destino sem esperar; a ordem de chamada é a ordem de envio no destino."""
+        fila = self._filas.get(destino)
+        if fila is None:
+            fila = self._filas[destino] = asyncio.Queue()
+            self._tarefas[destino] = asyncio.ensure_future(self._worker(destino, fila))
+        futuro = asyncio.get_running_loop().create_future()
+        fila.put_nowait((envio, futuro))
+        return futuro
+
+    async def _worker(self, destino: Any, fila: asyncio.Queue):
+        while True:
+            envio, futuro = await fila.get()
+            for tentativa in range(self.max_tentativas):
+                espera = self._ultimo_envio.get(destino, 0.0) + self.intervalo - time.monotonic()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                try:
+                    resultado = await envio()
+                except errors.FloodWaitError as e:
+                    self.flood_waits += 1
+                    log.warning(f"FloodWait de {e.seconds}s ao enviar para {destino}, fila pausada")
+                    self.tempo_pausado += e.seconds + 1
+                    await asyncio.sleep(e.seconds + 1)
+                    if tentativa + 1 == self.max_tentativas and not futuro.done():
+                        futuro.set_exception(e)
+                    continue
+                except Exception as e:
+                    if not futuro.done(): futuro.set_exception(e)
+                    break
+                finally:
+                    self._ultimo_envio[destino] = time.monotonic()
+                self.enviados += 1
+                if not futuro.done(): futuro.set_result(resultado)
+                break
+
+    async def parar(self):
+        for tarefa in self._tarefas.values():
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas.values(), return_exceptions=True)
+        self._tarefas.clear()
+        self._filas.clear()
+
+    def metricas(self) -> Dict[str, float]:
+        return {
+            'fila_envio_telegram': sum(f.qsize() for f in self._filas.values()),
+            'enviados': self.enviados,
+            'flood_waits': self.flood_waits,
+            'tempo_pausado': round(self.tempo_pausado, 1),
+        }
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Registro persistente (SQLite/WAL) das mensagens em andamento e do último id processado por canal
+"""
+
+import sqlite3
+import time
+from typing import Dict
+
+PENDENTE, CONCLUIDA = 'pendente', 'concluida'
+
+class FilaPersistente:
+    """Cada mensagem é registrada ao entrar e concluída depois do envio (ou do descarte).
+
+    Ao reiniciar, o que ficou pendente é reprocessado e o último id concluído de cada canal
+    define de onde o backfill continua. Uma mensagem só é registrada uma vez, então a mesma
+    mensagem vinda do backfill e do evento ao vivo é processada uma única vez.
+    """
+    def __init__(self, arquivo: str = 'fila_mensagens.db', reter_dias: float = 7):
+        self.arquivo = arquivo
+        self.reter_dias = reter_dias
+        self._conn = sqlite3.connect(arquivo)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS mensagens (
+            canal INTEGER NOT NULL,
+            msg_id INTEGER NOT NULL,
+            estado TEXT NOT NULL,
+            atualizado REAL NOT NULL,
+            PRIMARY KEY (canal, msg_id))''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_mensagens_estado ON mensagens (estado)')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS progresso (
+            canal INTEGER PRIMARY KEY,
+            ultimo_id INTEGER NOT NULL)''')
+        self._conn.commit()
+        self.limpar()
+
+    def registrar(self, canal: int, msg_id: int) -> bool:
+        """Marca a mensagem como pendente; retorna False se ela já tinha sido registrada antes."""
+        cursor = self._conn.execute('INSERT OR IGNORE INTO mensagens (canal, msg_id, estado, atualizado) VALUES (?, ?, ?, ?)',
+                                    (canal, msg_id, PENDENTE, time.time()))
+        self._conn.commit()
+        return cursor.rowcount == 1
+
+    def concluir(self, canal: int, msg_id: int, ultimo_id: int = 0):
+        """Marca como concluída e avança o progresso do canal até `ultimo_id` (ou `msg_id`)."""
+        self._conn.execute('UPDATE mensagens SET estado = ?, atualizado = ? WHERE canal = ? AND msg_id = ?',
+                           (CONCLUIDA, time.time(), canal, msg_id))
+        self._conn.execute('''INSERT INTO progresso (canal, ultimo_id) VALUES (?, ?)
+            ON CONFLICT (canal) DO UPDATE SET ultimo_id = MAX(ultimo_id, excluded.ultimo_id)''',
+                           (canal, max(msg_id, ultimo_id)))
+        self._conn.commit()
+
+    def pendentes(self) -> list[tuple[int, int]]:
+        return self._conn.execute('SELECT canal, msg_id FROM mensagens WHERE estado = ? ORDER BY canal, msg_id',
+                                  (PENDENTE,)).fetchall()
+
+    def ultimo_id(self, canal: int) -> int:
+        linha = self._conn.execute('SELECT ultimo_id FROM progresso WHERE canal = ?', (canal,)).fetchone()
+        return linha[0] if linha else 0
+
+    def limpar(self):
+        """Remove registros concluídos antigos (o progresso por canal continua guardado)."""
+        self._conn.execute('DELETE FROM mensagens WHERE estado = ? AND atualizado < ?',
+                           (CONCLUIDA, time.time() - self.reter_dias * 86400))
+        self._conn.commit()
+
+    def estatisticas(self) -> Dict[str, int]:
+        contagem = dict(self._conn.execute('SELECT estado, COUNT(*) FROM mensagens GROUP BY estado').fetchall())
+        return {'pendentes': contagem.get(PENDENTE, 0), 'concluidas': contagem.get(CONCLUIDA, 0)}
+
+    def fechar(self):
+        self._conn.close()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Filtro de palavras-chave/bloqueadas e substituição de palavras, ambos em uma única passada sobre o texto
+"""
+
+import re
+import unicodedata
+from typing import Iterable
+
+CHAVE, BLOQUEADA = 1, 2
+
+def remover_acentos(texto: str) -> str:
+    decomposto = unicodedata.normalize('NFD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+def montar_regex_trie(termos: Iterable[str]) -> str:
+    """Monta uma alternação fatorada por prefixo (trie), sem backtracking entre termos irmãos.
+
+    Os opcionais são gulosos, então em cada posição o regex casa o termo mais longo possível.
+    """
+    trie: dict = {}
+    for termo in termos:
+        no = trie
+        for c in termo:
+            no = no.setdefault(c, {})
+        no[''] = {}
+
+    def montar(no: dict) -> str:
+        ramos = [re.escape(c) + montar(filho) for c, filho in sorted(no.items()) if c != '']
+        if not ramos:
+            return ''
+        corpo = ramos[0] if len(ramos) == 1 else '(?:' + '|'.join(ramos) + ')'
+        return f'(?:{corpo})?' if '' in no else corpo
+
+    return montar(trie)
+
+class FiltroPalavras:
+    """Autômato montado uma vez a partir da Configuracao.
+
+    Cada termo casado pelo regex traz as categorias (chave/bloqueada) de todos os termos
+    contidos nele, então o termo mais longo em cada posição basta para não perder ocorrências.
+    """
+    def __init__(self, palavras_chave: list[str], palavras_bloqueadas: list[str],
+                 palavra_inteira: bool = False, ignorar_acentos: bool = False):
+        self.palavra_inteira = palavra_inteira
+        self.ignorar_acentos = ignorar_acentos
+        categorias: dict[str, int] = {}
+        for termos, categoria in ((palavras_chave, CHAVE), (palavras_bloqueadas, BLOQUEADA)):
+            for termo in termos:
+                termo = self._normalizar(termo)
+                if termo:
+                    categorias[termo] = categorias.get(termo, 0) | categoria
+        self._categorias = {termo: self._categorias_contidas(termo, categorias) for termo in categorias}
+        self._regex = None
+        if categorias:
+            padrao = montar_regex_trie(categorias)
+            if palavra_inteira:
+                padrao = rf'(?<!\w){padrao}(?!\w)'
+            # Lookahead: tenta casar em todas as posições sem consumir o texto
+            self._regex = re.compile(f'(?=({padrao}))')
+
+    def _normalizar(self, texto: str) -> str:
+        texto = texto.lower()
+        return remover_acentos(texto) if self.ignorar_acentos else texto
+
+    def _categorias_contidas(self, termo: str, categorias: dict[str, int]) -> int:
+        resultado = 0
+        for outro, categoria in categorias.items():
+            if self.palavra_inteira:
+                contido = re.search(rf'(?<!\w){re.escape(outro)}(?!\w)', termo) is not None
+            else:
+                contido = outro in termo
+            if contido:
+                resultado |= categoria
+        return resultado
+
+    def analisar(self, texto: str) -> tuple[bool, bool]:
+        """Retorna (tem palavra-chave, tem palavra bloqueada)."""
+        if self._regex is None:
+            return False, False
+        encontradas = 0
+        for m in self._regex.finditer(self._normalizar(texto)):
+            encontradas |= self._categorias[m.group(1)]
+            if encontradas == CHAVE | BLOQUEADA:
+                break
+        return bool(encontradas & CHAVE), bool(encontradas & BLOQUEADA)
+
+class SubstituidorPalavras:
+    """Aplica todas as SUBSTITUICOES em uma passada com um regex único (case insensitive).
+
+    Em chaves sobrepostas vence a mais longa; o texto substituído não é reprocessado.
+    """
+    def __init__(self, substituicoes: dict[str, str]):
+        self._mapa: dict[str, str] = {}
+        for original, nova in substituicoes.items():
+            if original:
+                # Como no processamento sequencial antigo, a primeira regra vence entre variações de caixa
+                self._mapa.setdefault(original.lower(), nova)
+        self._regex = re.compile(montar_regex_trie(self._mapa), re.IGNORECASE) if self._mapa else None
+
+    def _trocar(self, m: re.Match) -> str:
+        return self._mapa.get(m.group(0).lower(), m.group(0))
+
+    def substituir(self, texto: str) -> tuple[str, int]:
+        """Retorna (texto substituído, quantidade de substituições feitas)."""
+        if self._regex is None or not texto:
+            return texto, 0
+        return self._regex.subn(self._trocar, texto)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Controle de taxa das chamadas à Shopee: token bucket adaptativo, backoff e circuit breaker
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Dict
+
+log = logging.getLogger(__name__)
+
+class LimitadorTaxa:
+    """Token bucket compartilhado que reduz a taxa ao receber throttling e a recupera aos poucos (AIMD)."""
+    def __init__(self, taxa: float = 5.0, rajada: int = 10, taxa_min: float = 0.5, taxa_max: float = 20.0):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.taxa_min = taxa_min
+        self.taxa_max = taxa_max
+        self.throttlings = 0
+        self._tokens = float(rajada)
+        self._atualizado = time.monotonic()
+        self._pausado_ate = 0.0
+
+    def _repor(self):
+        agora = time.monotonic()
+        self._tokens = min(self.rajada, self._tokens + (agora - self._atualizado) * self.taxa)
+        self._atualizado = agora
+
+    async def adquirir(self):
+        """Reserva um token e espera a vez dele (o saldo fica negativo enquanto há fila)."""
+        self._repor()
+        self._tokens -= 1
+        espera = max(-self._tokens / self.taxa, self._pausado_ate - time.monotonic())
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+    def sucesso(self):
+        self.taxa = min(self.taxa_max, self.taxa + 0.1)
+
+    def throttling(self, retry_after: float = 0.0):
+        """Chamado em HTTP 429 / erro de limite: corta a taxa pela metade e pausa se a Shopee pediu."""
+        self.throttlings += 1
+        self.taxa = max(self.taxa_min, self.taxa / 2)
+        self._tokens = min(self._tokens, 0.0)
+        if retry_after > 0:
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + retry_after)
+
+class DisjuntorCircuito:
+    """Circuit breaker: abre após falhas seguidas e libera uma tentativa depois do tempo de recuperação."""
+    FECHADO, ABERTO, MEIO_ABERTO = 'fechado', 'aberto', 'meio-aberto'
+
+    def __init__(self, limiar_falhas: int = 5, tempo_recuperacao: float = 30.0):
+        self.limiar_falhas = limiar_falhas
+        self.tempo_recuperacao = tempo_recuperacao
+        self.estado = self.FECHADO
+        self._falhas = 0
+        self._aberto_em = 0.0
+
+    def permite(self) -> bool:
+        if self.estado == self.ABERTO and time.monotonic() - self._aberto_em >= self.tempo_recuperacao:
+            self.estado = self.MEIO_ABERTO
+            return True
+        return self.estado != self.ABERTO
+
+    def sucesso(self):
+        self._falhas = 0
+        self.estado = self.FECHADO
+
+    def falha(self):
+        self._falhas += 1
+        if self.estado == self.MEIO_ABERTO or self._falhas >= self.limiar_falhas:
+            if self.estado != self.ABERTO:
+                log.error(f"Circuit breaker da Shopee aberto por {self.tempo_recuperacao:.0f}s")
+            self.estado = self.ABERTO
+            self._aberto_em = time.monotonic()
+
+def atraso_backoff(tentativa: int, base: float = 1.0, maximo: float = 30.0) -> float:
+    """Backoff exponencial com jitter completo."""
+    return random.uniform(0, min(maximo, base * 2 ** tentativa))
+
+def estatisticas(limitador: LimitadorTaxa, disjuntor: DisjuntorCircuito) -> Dict[str, object]:
+    return {'taxa': round(limitador.taxa, 2), 'throttlings': limitador.throttlings, 'circuito': disjuntor.estado}
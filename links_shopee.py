@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Extração, normalização e reescrita de links Shopee em uma única passada pelo texto
+"""
+
+import re
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DOMINIOS_SHOPEE = ("shopee.com.br", "shopee.com.my", "shopee.com.ph", "shopee.com.sg", "shopee.com.tw",
+                   "shopee.co.id", "shopee.co.th", "shopee.vn", "shopee.com")
+# Encurtadores da Shopee (além dos subdomínios s.<domínio>)
+DOMINIOS_SHORTLINK = ("shp.ee", "shope.ee")
+
+_HOSTS = '|'.join(re.escape(d) for d in sorted(DOMINIOS_SHOPEE + DOMINIOS_SHORTLINK, key=len, reverse=True))
+# Parênteses, colchetes e aspas encerram o link: assim o alvo de [texto](url) do markdown do
+# Telethon (MessageEntityTextUrl em mensagem.text) sai com o span exato. Pontuação final fica de fora.
+REGEX_SHOPEE = re.compile(
+    rf'https?://(?:[\w-]+\.)*(?:{_HOSTS})(?![\w.-])(?::\d+)?[/?][^\s<>()\[\]"]*[^\s<>()\[\]".,;:!?\'*~]',
+    re.IGNORECASE)
+
+# Caminhos que já identificam um produto (nome-i.<loja>.<item> ou /product/<loja>/<item>)
+REGEX_PRODUTO = re.compile(r'(?:-i\.|/product/)(\d+)[./](\d+)')
+
+# Parâmetros de rastreamento que não mudam o produto apontado pelo link
+PARAMETROS_RASTREIO = ('sp_atk', 'xptdk', 'smtt', 'uls_trackid', 'mmp_pid', 'gads_t_sig', 'utm_', 'af_', 'deep_and_deferred')
+
+class LinkEncontrado(NamedTuple):
+    inicio: int
+    fim: int
+    url: str
+
+def extrair_links_shopee(texto: str) -> list[LinkEncontrado]:
+    """Retorna todos os links Shopee do texto com suas posições, na ordem em que aparecem."""
+    return [LinkEncontrado(m.start(), m.end(), m.group(0)) for m in REGEX_SHOPEE.finditer(texto)]
+
+def _host(url: str) -> str:
+    return urlsplit(url.strip()).hostname or ''
+
+def is_shopee_url(url: str) -> bool:
+    host = _host(url)
+    return any(host == d or host.endswith('.' + d) for d in DOMINIOS_SHOPEE + DOMINIOS_SHORTLINK)
+
+def e_shortlink(url: str) -> bool:
+    host = _host(url)
+    return host in DOMINIOS_SHORTLINK or (host.startswith('s.') and host[2:] in DOMINIOS_SHOPEE)
+
+def e_url_produto(url: str) -> bool:
+    return REGEX_PRODUTO.search(urlsplit(url).path) is not None
+
+def extrair_ids_produto(url: str) -> Optional[tuple[str, str]]:
+    """Retorna (shop_id, item_id) de um link de produto, ou None se o link não identifica o produto."""
+    m = REGEX_PRODUTO.search(urlsplit(url).path)
+    return (m.group(1), m.group(2)) if m else None
+
+def normalizar_url_shopee(url: str) -> str:
+    """Normaliza um link Shopee: https, host sem www, sem parâmetros de rastreamento nem fragmento."""
+    partes = urlsplit(url.strip())
+    host = partes.netloc.lower().removeprefix('www.')
+    query = [(k, v) for k, v in parse_qsl(partes.query, keep_blank_values=True)
+             if not k.lower().startswith(PARAMETROS_RASTREIO)]
+    return urlunsplit(('https', host, partes.path.rstrip('/'), urlencode(sorted(query)), ''))
+
+def reconstruir_texto(texto: str, links: list[LinkEncontrado], novos: list[Optional[str]]) -> str:
+    """Monta o texto final em uma passada, trocando cada span pelo novo link (None mantém o original)."""
+    partes = []
+    posicao = 0
+    for link, novo in zip(links, novos):
+        partes.append(texto[posicao:link.inicio])
+        partes.append(novo if novo else link.url)
+        posicao = link.fim
+    partes.append(texto[posicao:])
+    return ''.join(partes)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Mapeamento persistente (SQLite/WAL) entre a mensagem de origem e as cópias enviadas a cada destino
+"""
+
+import json
+import sqlite3
+import time
+from typing import Dict, NamedTuple
+
+class EnvioRegistrado(NamedTuple):
+    canal_destino: str
+    msg_destino: int
+    texto_origem: str
+    sub_ids: tuple[str, ...]
+    # link original -> link convertido, para reaproveitar na edição
+    conversoes: Dict[str, str]
+
+class MapeamentoMensagens:
+    """(canal de origem, id) -> (canal de destino, id enviado), com o texto de origem e os links convertidos.
+
+    Em álbuns todas as partes apontam para a mensagem de destino que leva a legenda, cada uma com o
+    próprio texto: editar uma parte sem legenda não muda o texto dela, e a edição é ignorada.
+    """
+    def __init__(self, arquivo: str = 'mapeamento_mensagens.db', reter_dias: float = 7):
+        self.arquivo = arquivo
+        self.reter_dias = reter_dias
+        self._conn = sqlite3.connect(arquivo)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS envios (
+            canal_origem INTEGER NOT NULL,
+            msg_origem INTEGER NOT NULL,
+            canal_destino TEXT NOT NULL,
+            msg_destino INTEGER NOT NULL,
+            texto_origem TEXT NOT NULL,
+            sub_ids TEXT NOT NULL,
+            conversoes TEXT NOT NULL,
+            atualizado REAL NOT NULL,
+            PRIMARY KEY (canal_origem, msg_origem, canal_destino))''')
+        self._conn.commit()
+        self.limpar()
+
+    def salvar(self, canal_origem: int, textos_origem: Dict[int, str], canal_destino: str, msg_destino: int,
+               sub_ids: tuple[str, ...], conversoes: Dict[str, str]):
+        """`textos_origem`: id -> texto de cada mensagem de origem (as partes de um álbum)."""
+        agora = time.time()
+        self._conn.executemany('INSERT OR REPLACE INTO envios VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               [(canal_origem, msg_id, canal_destino, msg_destino, texto_origem,
+                                 json.dumps(list(sub_ids)), json.dumps(conversoes), agora)
+                                for msg_id, texto_origem in textos_origem.items()])
+        self._conn.commit()
+
+    def buscar(self, canal_origem: int, msg_origem: int) -> list[EnvioRegistrado]:
+        linhas = self._conn.execute('''SELECT canal_destino, msg_destino, texto_origem, sub_ids, conversoes
+            FROM envios WHERE canal_origem = ? AND msg_origem = ?''', (canal_origem, msg_origem)).fetchall()
+        return [EnvioRegistrado(canal, msg_destino, texto, tuple(json.loads(sub_ids)), json.loads(conversoes))
+                for canal, msg_destino, texto, sub_ids, conversoes in linhas]
+
+    def atualizar(self, canal_origem: int, msg_origem: int, canal_destino: str, texto_origem: str, conversoes: Dict[str, str]):
+        """Guarda o texto e os links da versão editada, base para a próxima edição."""
+        self._conn.execute('''UPDATE envios SET texto_origem = ?, conversoes = ?, atualizado = ?
+            WHERE canal_origem = ? AND msg_origem = ? AND canal_destino = ?''',
+                           (texto_origem, json.dumps(conversoes), time.time(), canal_origem, msg_origem, canal_destino))
+        self._conn.commit()
+
+    def limpar(self):
+        """Remove mapeamentos antigos: edições depois de `reter_dias` não são mais propagadas."""
+        self._conn.execute('DELETE FROM envios WHERE atualizado < ?', (time.time() - self.reter_dias * 86400,))
+        self._conn.commit()
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {'itens': self._conn.execute('SELECT COUNT(*) FROM envios').fetchone()[0]}
+
+    def fechar(self):
+        self._conn.close()
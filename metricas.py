@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Logs com nível configurável e métricas do bot: contadores, histogramas de latência por estágio e filas
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from aiohttp import web
+
+# Limites dos buckets de latência (segundos), no formato de histograma do Prometheus
+BUCKETS_LATENCIA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIXO = 'bot_cupons'
+
+def configurar_logs(nivel: str = 'INFO'):
+    """Configura os logs do bot; LOG_NIVEL=OFF desliga tudo (inclusive erros)."""
+    nivel = nivel.strip().upper() or 'INFO'
+    logging.addLevelName(logging.ERROR, 'ERRO')
+    logging.addLevelName(logging.WARNING, 'AVISO')
+    logging.basicConfig(format='%(asctime)s [%(levelname)s] %(message)s', datefmt='%H:%M:%S')
+    raiz = logging.getLogger()
+    if nivel in ('OFF', 'NENHUM', 'DESLIGADO'):
+        raiz.setLevel(logging.CRITICAL + 1)
+    else:
+        raiz.setLevel(getattr(logging, nivel, logging.INFO))
+    # O Telethon é muito verboso em INFO
+    logging.getLogger('telethon').setLevel(max(raiz.level, logging.WARNING))
+
+class Histograma:
+    def __init__(self, limites: tuple[float, ...] = BUCKETS_LATENCIA):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def quantil(self, q: float) -> float:
+        """Estimativa pelo limite superior do bucket (o último bucket usa o maior limite)."""
+        if not self.total:
+            return 0.0
+        alvo = q * self.total
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return self.limites[min(i, len(self.limites) - 1)]
+        return self.limites[-1]
+
+class Metricas:
+    """Contadores e histogramas atualizados no caminho quente (só somas, sem I/O) e filas lidas na exportação.
+
+    `registrar_coletor(funcao)` adiciona uma função que devolve um dict nome -> valor lido só quando
+    as métricas são exportadas (tamanho das filas, estatísticas de cache etc.).
+    """
+    def __init__(self):
+        self.contadores: Dict[str, float] = {}
+        self.latencias: Dict[str, Histograma] = {}
+        self._coletores: list[Callable[[], Dict[str, object]]] = []
+        self._servidor: Optional[web.AppRunner] = None
+        self._resumo: Optional[asyncio.Task] = None
+
+    def incrementar(self, nome: str, valor: float = 1):
+        self.contadores[nome] = self.contadores.get(nome, 0) + valor
+
+    def observar(self, estagio: str, segundos: float):
+        histograma = self.latencias.get(estagio)
+        if histograma is None:
+            histograma = self.latencias[estagio] = Histograma()
+        histograma.observar(segundos)
+
+    @contextmanager
+    def medir(self, estagio: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(estagio, time.perf_counter() - inicio)
+
+    def registrar_coletor(self, coletor: Callable[[], Dict[str, object]]):
+        self._coletores.append(coletor)
+
+    def coletar(self) -> Dict[str, float]:
+        valores: Dict[str, float] = {}
+        for coletor in self._coletores:
+            try:
+                dados = coletor()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Falha ao coletar métricas: {e}")
+                continue
+            # Só valores numéricos viram métricas (ex.: o estado do circuito é texto)
+            valores.update({nome: valor for nome, valor in dados.items()
+                            if isinstance(valor, (int, float)) and not isinstance(valor, bool)})
+        return valores
+
+    def formatar_prometheus(self) -> str:
+        linhas = []
+        for nome, valor in sorted(self.contadores.items()):
+            linhas.append(f"# TYPE {PREFIXO}_{nome}_total counter")
+            linhas.append(f"{PREFIXO}_{nome}_total {valor}")
+        if self.latencias:
+            nome = f"{PREFIXO}_latencia_segundos"
+            linhas.append(f"# TYPE {nome} histogram")
+            for estagio, h in sorted(self.latencias.items()):
+                acumulado = 0
+                for limite, contagem in zip(h.limites + (float('inf'),), h.contagens):
+                    acumulado += contagem
+                    le = '+Inf' if limite == float('inf') else f"{limite:g}"
+                    linhas.append(f'{nome}_bucket{{estagio="{estagio}",le="{le}"}} {acumulado}')
+                linhas.append(f'{nome}_sum{{estagio="{estagio}"}} {h.soma:.6f}')
+                linhas.append(f'{nome}_count{{estagio="{estagio}"}} {h.total}')
+        for nome, valor in sorted(self.coletar().items()):
+            linhas.append(f"# TYPE {PREFIXO}_{nome} gauge")
+            linhas.append(f"{PREFIXO}_{nome} {valor}")
+        return '\n'.join(linhas) + '\n'
+
+    def resumo(self) -> str:
+        partes = [f"{estagio}: n={h.total} média={h.soma / h.total * 1000:.1f}ms "
+                  f"p50<={h.quantil(0.5) * 1000:g}ms p99<={h.quantil(0.99) * 1000:g}ms"
+                  for estagio, h in sorted(self.latencias.items()) if h.total]
+        partes.append(f"contadores={dict(sorted(self.contadores.items()))}")
+        partes.append(f"filas={self.coletar()}")
+        return ' | '.join(partes)
+
+    async def iniciar_servidor(self, porta: int, host: str = '127.0.0.1'):
+        """Endpoint /metrics no formato texto do Prometheus (só na interface local por padrão)."""
+        async def responder(_):
+            return web.Response(text=self.formatar_prometheus(), content_type='text/plain')
+        app = web.Application()
+        app.router.add_get('/metrics', responder)
+        self._servidor = web.AppRunner(app, access_log=None)
+        await self._servidor.setup()
+        await web.TCPSite(self._servidor, host, porta).start()
+        logging.getLogger(__name__).info(f"Métricas disponíveis em http://{host}:{porta}/metrics")
+
+    def iniciar_resumo(self, intervalo: float):
+        """Escreve um resumo das métricas no log a cada `intervalo` segundos."""
+        async def repetir():
+            while True:
+                await asyncio.sleep(intervalo)
+                logging.getLogger(__name__).info(f"Métricas: {self.resumo()}")
+        self._resumo = asyncio.ensure_future(repetir())
+
+    async def parar(self):
+        if self._resumo:
+            self._resumo.cancel()
+            await asyncio.gather(self._resumo, return_exceptions=True)
+            self._resumo = None
+        if self._servidor:
+            await self._servidor.cleanup()
+            self._servidor = None
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline em estágios entre os eventos do Telethon e o envio: entrada -> workers de conversão -> envio ordenado
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+class PipelineMensagens:
+    """Fila de entrada limitada, pool de workers e um estágio de envio que preserva a ordem por canal.
+
+    `processar(mensagem)` devolve o que deve ser enviado (ou None para não enviar nada) e
+    `enviar(mensagem, resultado)` faz o envio. Mensagens do mesmo canal saem na ordem de chegada,
+    mesmo que os workers terminem fora de ordem.
+
+    O estágio de envio não espera cada envio terminar: cada `enviar` começa em uma tarefa própria,
+    na ordem do canal, e até `tamanho_fila` ficam em andamento. Para a ordem valer até o destino,
+    `enviar` deve entregar tudo à fila de envio antes de esperar qualquer coisa (AgendadorEnvio.agendar).
+    """
+    def __init__(self, processar: Callable[[Any], Awaitable[Optional[Any]]],
+                 enviar: Callable[[Any, Any], Awaitable[None]], workers: int = 4, tamanho_fila: int = 100):
+        self.processar = processar
+        self.enviar = enviar
+        self.workers = max(1, workers)
+        self.fila_entrada: asyncio.Queue = asyncio.Queue(maxsize=tamanho_fila)
+        # Também limitada: um envio parado (FloodWait) segura os workers e, por eles, a entrada
+        self.fila_envio: asyncio.Queue = asyncio.Queue(maxsize=tamanho_fila)
+        self._proxima_sequencia: Dict[Any, int] = {}
+        self._proximo_envio: Dict[Any, int] = {}
+        self._aguardando_ordem: Dict[Any, Dict[int, tuple[Any, Optional[Any]]]] = {}
+        self._tarefas: list[asyncio.Task] = []
+        self._envios: set[asyncio.Task] = set()
+        self.max_envios = max(1, tamanho_fila)
+        self._vagas_envio = asyncio.Semaphore(self.max_envios)
+        self.recebidas = 0
+        self.processadas = 0
+        self.enviadas = 0
+        self.erros = 0
+        self.esperas_backpressure = 0
+        self.tempo_backpressure = 0.0
+
+    async def iniciar(self):
+        if self._tarefas:
+            return
+        self._tarefas = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tarefas.append(asyncio.ensure_future(self._enviador()))
+
+    async def parar(self):
+        """Cancela workers e envio e descarta o que estava em andamento.
+
+        Uma mensagem cancelada no meio da conversão nunca ocuparia a vez dela na ordem do canal, então
+        as filas e a numeração recomeçam do zero; a fila persistente recupera o que ficou para trás.
+        """
+        tarefas = self._tarefas + list(self._envios)
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        self._tarefas = []
+        self._envios.clear()
+        self._vagas_envio = asyncio.Semaphore(self.max_envios)
+        self.fila_entrada = asyncio.Queue(maxsize=self.fila_entrada.maxsize)
+        self.fila_envio = asyncio.Queue(maxsize=self.fila_envio.maxsize)
+        self._proxima_sequencia.clear()
+        self._proximo_envio.clear()
+        self._aguardando_ordem.clear()
+
+    async def receber(self, canal: Any, mensagem: Any):
+        """Estágio de entrada: numera a mensagem dentro do canal e espera vaga na fila (backpressure)."""
+        sequencia = self._proxima_sequencia.get(canal, 0)
+        self._proxima_sequencia[canal] = sequencia + 1
+        self.recebidas += 1
+        if self.fila_entrada.full():
+            self.esperas_backpressure += 1
+            inicio = time.monotonic()
+            await self.fila_entrada.put((canal, sequencia, mensagem))
+            self.tempo_backpressure += time.monotonic() - inicio
+        else:
+            self.fila_entrada.put_nowait((canal, sequencia, mensagem))
+
+    async def _worker(self):
+        while True:
+            canal, sequencia, mensagem = await self.fila_entrada.get()
+            try:
+                resultado = await self.processar(mensagem)
+            except Exception as e:
+                self.erros += 1
+                log.error(f"Falha ao processar mensagem: {e}")
+                resultado = None
+            finally:
+                self.fila_entrada.task_done()
+            self.processadas += 1
+            # Mesmo sem resultado a vaga na ordem precisa ser liberada
+            await self.fila_envio.put((canal, sequencia, mensagem, resultado))
+
+    async def _enviador(self):
+        while True:
+            canal, sequencia, mensagem, resultado = await self.fila_envio.get()
+            pendentes = self._aguardando_ordem.setdefault(canal, {})
+            pendentes[sequencia] = (mensagem, resultado)
+            proximo = self._proximo_envio.get(canal, 0)
+            while proximo in pendentes:
+                mensagem, resultado = pendentes.pop(proximo)
+                proximo += 1
+                self._proximo_envio[canal] = proximo
+                if resultado is None:
+                    continue
+                # Tarefas criadas em sequência começam na mesma sequência: a ordem do canal é mantida
+                await self._vagas_envio.acquire()
+                tarefa = asyncio.ensure_future(self._enviar(mensagem, resultado))
+                self._envios.add(tarefa)
+                tarefa.add_done_callback(self._envios.discard)
+
+    async def _enviar(self, mensagem: Any, resultado: Any):
+        try:
+            await self.enviar(mensagem, resultado)
+            self.enviadas += 1
+        except Exception as e:
+            self.erros += 1
+            log.error(f"Falha ao enviar mensagem: {e}")
+        finally:
+            self._vagas_envio.release()
+
+    def metricas(self) -> Dict[str, float]:
+        return {
+            'fila_entrada': self.fila_entrada.qsize(),
+            'fila_entrada_max': self.fila_entrada.maxsize,
+            'fila_envio': self.fila_envio.qsize(),
+            'aguardando_ordem': sum(len(p) for p in self._aguardando_ordem.values()),
+            'envios_em_andamento': len(self._envios),
+            'recebidas': self.recebidas,
+            'processadas': self.processadas,
+            'enviadas': self.enviadas,
+            'erros': self.erros,
+            'esperas_backpressure': self.esperas_backpressure,
+            'tempo_backpressure': round(self.tempo_backpressure, 3),
+        }
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Modo supervisor: os canais de origem são divididos entre processos ouvintes, cada um com a própria
+sessão do Telegram, e um único processo converte e envia tudo, na ordem de cada canal
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+from telethon import TelegramClient
+
+import bot_cupons
+from bot_cupons import metricas
+from deduplicacao import gerar_impressao
+
+log = logging.getLogger(__name__)
+
+def nome_sessao(indice: int) -> str:
+    return f'session_cupons_{indice}'
+
+def dividir_canais(canais: list[str], partes: int) -> list[list[str]]:
+    """Distribui os canais em até `partes` grupos; cada canal fica em um único processo (a ordem dele é preservada)."""
+    return [grupo for grupo in (canais[i::partes] for i in range(partes)) if grupo]
+
+def executar_ouvinte(indice: int, canais: list[str], saida, arquivo_config: str, ambiente_inicial: dict[str, str]):
+    """Processo ouvinte: escuta só `canais`, filtra e entrega em `saida` as mensagens aceitas.
+
+    A conversão fica no supervisor: o limite de taxa da Shopee, os lotes e o cache de links são
+    únicos para todos os canais. A fila persistente é o mesmo arquivo SQLite (WAL) em todos os processos.
+    """
+    # O processo herda o ambiente com o .env já carregado; parte do ambiente de antes dele, como o
+    # supervisor, para uma linha apagada do arquivo voltar ao valor original e não ao do arquivo antigo
+    os.environ.clear()
+    os.environ.update(ambiente_inicial)
+    app = bot_cupons.criar_aplicacao(arquivo_config, sessao=nome_sessao(indice), canais=canais, ouvir=True)
+    app.saida = saida
+    app.config.supervisor_processos = 0
+    if app.config.metricas_porta:
+        app.config.metricas_porta += 1 + indice
+    # Cada ouvinte só vê os próprios canais; a checagem entre canais é refeita no supervisor
+    if app.indice_duplicatas:
+        app.indice_duplicatas.arquivo = ''
+    bot_cupons.iniciar_bot()
+
+async def receber_repassada(chat_id, mensagem, canais: list[str]):
+    """Mensagem aceita por um ouvinte: refaz a checagem de duplicatas entre ouvintes e entra no pipeline."""
+    app = bot_cupons.app
+    # Regras do próprio supervisor (recarregadas junto com as dos ouvintes)
+    destinos = [destino for destino in app.config.destinos if destino.canal in canais]
+    if destinos and app.indice_duplicatas:
+        texto = bot_cupons.obter_texto(mensagem)
+        destinos = bot_cupons.descartar_duplicadas(gerar_impressao(texto, bot_cupons.obter_id_media(mensagem)), destinos, texto)
+    if not destinos:
+        bot_cupons.concluir_mensagem(chat_id, mensagem)
+        return
+    await bot_cupons.entrar_no_pipeline(chat_id, mensagem, destinos)
+
+def tamanho_fila(saida) -> dict:
+    try:
+        return {'fila_supervisor': saida.qsize()}
+    except NotImplementedError:
+        # qsize() não existe no macOS
+        return {}
+
+async def consumir(saida):
+    """Passa ao pipeline (ou propaga a edição), na ordem de chegada, o que os ouvintes colocam em `saida`."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            # Timeout curto para a thread não ficar presa no get() quando a tarefa é cancelada
+            envio = await loop.run_in_executor(None, saida.get, True, 1.0)
+        except queue.Empty:
+            continue
+        try:
+            if envio[0] == 'edicao':
+                await bot_cupons.propagar_edicao(*envio[1:])
+            else:
+                await receber_repassada(*envio[1:])
+        except Exception as e:
+            log.error(f"Falha ao processar mensagem do ouvinte: {e}")
+
+def iniciar_supervisor():
+    app = bot_cupons.app
+    config = app.config
+    grupos = dividir_canais(config.canais_origem, config.supervisor_processos)
+    # Login de cada sessão aqui, com terminal: os processos ouvintes não têm stdin
+    for indice in range(len(grupos)):
+        with TelegramClient(nome_sessao(indice), config.api_id, config.api_hash):
+            pass
+    contexto = multiprocessing.get_context('spawn')
+    saida = contexto.Queue(maxsize=config.tamanho_fila * len(grupos))
+    processos: dict[int, multiprocessing.Process] = {}
+
+    def iniciar_ouvinte(indice: int):
+        processo = contexto.Process(target=executar_ouvinte,
+                                    args=(indice, grupos[indice], saida, app.arquivo_config, app.ambiente_inicial),
+                                    name=f'ouvinte-{indice}')
+        processo.start()
+        processos[indice] = processo
+        log.info(f"Ouvinte {indice} (pid {processo.pid}): {grupos[indice]}")
+
+    async def vigiar_ouvintes():
+        while True:
+            await asyncio.sleep(5)
+            for indice, processo in list(processos.items()):
+                if not processo.is_alive():
+                    log.error(f"Ouvinte {indice} parou (código {processo.exitcode}), reiniciando")
+                    iniciar_ouvinte(indice)
+
+    def repassar_sighup():
+        # As regras do supervisor (conversão, substituições, destinos) e as de cada ouvinte (filtros)
+        app.recarregar_regras()
+        for processo in processos.values():
+            if processo.is_alive():
+                os.kill(processo.pid, signal.SIGHUP)
+
+    for indice in range(len(grupos)):
+        iniciar_ouvinte(indice)
+    metricas.registrar_coletor(lambda: tamanho_fila(saida))
+    try:
+        while True:
+            try:
+                log.info(f"Supervisor iniciado com {len(grupos)} ouvinte(s). Destinos: {config.destinos}")
+                with app.client:
+                    tarefas = []
+                    try:
+                        app.client.loop.run_until_complete(app.pipeline.iniciar())
+                        app.client.loop.run_until_complete(bot_cupons.iniciar_metricas())
+                        tarefas = [app.client.loop.create_task(consumir(saida)),
+                                   app.client.loop.create_task(vigiar_ouvintes()),
+                                   app.client.loop.create_task(app.vigiar_config())]
+                        if hasattr(signal, 'SIGHUP'):
+                            app.client.loop.add_signal_handler(signal.SIGHUP, repassar_sighup)
+                        app.client.run_until_disconnected()
+                    finally:
+                        for tarefa in tarefas:
+                            tarefa.cancel()
+                        app.client.loop.run_until_complete(asyncio.gather(*tarefas, return_exceptions=True))
+                        app.client.loop.run_until_complete(bot_cupons.parar_pipeline())
+                        app.client.loop.run_until_complete(app.agendador_envio.parar())
+                        app.client.loop.run_until_complete(metricas.parar())
+                        log.info(f"Métricas: {metricas.resumo()}")
+                        if app.indice_duplicatas:
+                            app.indice_duplicatas.salvar()
+                        app.client.loop.run_until_complete(bot_cupons.fechar_sessao_http())
+            except Exception as e:
+                log.error(f"O supervisor parou devido a: {e}")
+                log.info("Tentando reiniciar em 10 segundos...")
+                time.sleep(10)
+    finally:
+        for processo in processos.values():
+            processo.terminate()
+        for processo in processos.values():
+            processo.join(5)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+# Os módulos do bot ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# benchmark_bot preenche o ambiente com valores fictícios antes de importar o bot
+from benchmark_bot import ServidorShopeeFalso
+
+@pytest.fixture(scope='session')
+def servidor():
+    servidor = ServidorShopeeFalso(latencia=0.0)
+    servidor.iniciar()
+    yield servidor
+    servidor.parar()
+
+@pytest.fixture(autouse=True)
+def limpar_servidor(servidor):
+    servidor.roteiro, servidor.retry_after, servidor.requisicoes = [], 0.0, 0
+    servidor.taxa_429 = servidor.taxa_throttling = servidor.taxa_erro = 0.0
+    yield
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Conversão em lote sem Telegram e leitura da exportação do Telegram Desktop
+"""
+
+import argparse
+import asyncio
+import json
+
+import bot_cupons
+from benchmark_bot import criar_api
+from benchmark_replay import carregar_corpus
+from bot_cupons import AgrupadorLinks, SUB_IDS_PADRAO
+from converter_lote import converter_lote
+
+URL = "https://shopee.com.br/produto-1-i.1000.2000"
+
+def escrever_export(arquivo):
+    mensagens = [{'id': 1, 'type': 'message', 'text': ["Oferta ", {'type': 'text_link', 'text': "aqui", 'href': URL}]},
+                 {'id': 2, 'type': 'service', 'text': ''},
+                 {'id': 3, 'type': 'message', 'text': "Sem link"}]
+    arquivo.write_text(json.dumps({'name': 'canal', 'messages': mensagens}), encoding='utf-8')
+
+def test_corpus_do_benchmark_usa_o_href_das_entidades(tmp_path):
+    arquivo = tmp_path / 'result.json'
+    escrever_export(arquivo)
+    assert carregar_corpus(str(arquivo)) == [f"Oferta {URL}", "Sem link"]
+
+def test_converte_sem_configuracao_do_telegram(servidor, tmp_path, monkeypatch):
+    for chave in ('API_ID', 'API_HASH', 'CANAL_ORIGEM', 'CANAL_DESTINO', 'DESTINOS'):
+        monkeypatch.delenv(chave, raising=False)
+    monkeypatch.setenv('CACHE_LINKS_ARQUIVO', str(tmp_path / 'cache_links.db'))
+    entrada, saida = tmp_path / 'result.json', tmp_path / 'historico.jsonl'
+    escrever_export(entrada)
+    app = bot_cupons.criar_conversor('')
+    assert not hasattr(app, 'client') and not hasattr(app, 'fila_persistente')
+    app.shopee_api = criar_api(servidor, cache=app.cache_links)
+    app.agrupador_links = AgrupadorLinks(app.shopee_api, 0.01, 20)
+    args = argparse.Namespace(entrada=str(entrada), saida=str(saida), formato='auto', blocos=False, sub_ids=SUB_IDS_PADRAO,
+                              concorrencia=4, checkpoint=None, intervalo_checkpoint=500, reiniciar=False)
+    totais = asyncio.run(converter_lote(args))
+    linhas = [json.loads(linha) for linha in saida.read_text(encoding='utf-8').splitlines()]
+    assert totais['itens'] == 3 and totais['itens_com_falha'] == 0
+    assert [linha['id'] for linha in linhas] == [1, 3]
+    assert "s.shopee.com.br/af" in linhas[0]['texto'] and URL not in linhas[0]['texto']
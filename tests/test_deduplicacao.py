@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Índice de duplicatas: gravação periódica em disco e escopo por destino
+"""
+
+import asyncio
+
+import bot_cupons
+from benchmark_replay import MensagemFalsa
+from bot_cupons import SUB_IDS_PADRAO, Destino
+from deduplicacao import IndiceDuplicatas, gerar_impressao
+
+def test_indice_e_salvo_sem_desligamento_limpo(tmp_path):
+    arquivo = str(tmp_path / 'duplicatas.json')
+    indice = IndiceDuplicatas(arquivo=arquivo, salvar_a_cada=2)
+    indice.verificar_e_registrar(gerar_impressao("https://shopee.com.br/a-i.1.1"))
+    indice.verificar_e_registrar(gerar_impressao("https://shopee.com.br/b-i.2.2"))
+    # Sem chamar salvar(): um processo novo já enxerga as duas ofertas
+    reiniciado = IndiceDuplicatas(arquivo=arquivo)
+    assert reiniciado.verificar_e_registrar(gerar_impressao("https://shopee.com.br/b-i.2.2"))
+    assert reiniciado.estatisticas()['itens'] == 2
+
+def test_escopos_sao_independentes():
+    indice = IndiceDuplicatas()
+    impressao = gerar_impressao("https://shopee.com.br/a-i.1.1")
+    assert not indice.verificar_e_registrar(impressao, escopo='@a')
+    assert not indice.verificar_e_registrar(impressao, escopo='@b')
+    assert indice.verificar_e_registrar(impressao, escopo='@a')
+
+def test_oferta_repetida_so_cai_para_o_destino_que_ja_recebeu():
+    recebidas = []
+    class Pipeline:
+        async def receber(self, canal, item):
+            recebidas.append((canal, [d.nome for d in item[2]]))
+
+    async def executar():
+        app = bot_cupons.criar_aplicacao('', sessao=None, ouvir=False)
+        app.config.destinos = [Destino('a', '@a', ['ps5'], [], {}, SUB_IDS_PADRAO),
+                               Destino('b', '@b', ['xbox'], [], {}, SUB_IDS_PADRAO)]
+        app.indice_duplicatas = IndiceDuplicatas()
+        app.fila_persistente = None
+        app.pipeline = Pipeline()
+        oferta = "https://shopee.com.br/console-i.5.5"
+        await bot_cupons.receber_mensagem(-1, MensagemFalsa(1, f"ps5 {oferta}"))
+        # Mesmo produto em outro canal, mas só o destino B aceita esta cópia
+        await bot_cupons.receber_mensagem(-2, MensagemFalsa(1, f"xbox {oferta}"))
+        await bot_cupons.receber_mensagem(-3, MensagemFalsa(1, f"ps5 e xbox {oferta}"))
+    asyncio.run(executar())
+    assert recebidas == [(-1, ['a']), (-2, ['b'])]
+
+def test_mesmo_modelo_de_texto_com_produtos_diferentes_nao_e_duplicata():
+    indice = IndiceDuplicatas()
+    modelo = "🔥 Oferta relâmpago imperdível só hoje corre que acaba {}"
+    assert not indice.verificar_e_registrar(gerar_impressao(modelo.format("https://shopee.com.br/a-i.111.222")))
+    assert not indice.verificar_e_registrar(gerar_impressao(modelo.format("https://shopee.com.br/b-i.333.444")))
+    # Mesmo texto e mesmo produto continua sendo duplicata
+    assert indice.verificar_e_registrar(gerar_impressao(modelo.format("https://shopee.com.br/b-i.333.444")))
+
+def test_mesmo_banner_com_produtos_diferentes_nao_e_duplicata():
+    indice = IndiceDuplicatas()
+    assert not indice.verificar_e_registrar(gerar_impressao("Fone https://shopee.com.br/a-i.111.222", 'banner'))
+    assert not indice.verificar_e_registrar(gerar_impressao("Mouse https://shopee.com.br/b-i.333.444", 'banner'))
+    # Sem produto, a mídia repetida ainda identifica o repost
+    assert indice.verificar_e_registrar(gerar_impressao("Olha isso", 'banner'))
+
+def test_indice_salvo_guarda_os_produtos(tmp_path):
+    arquivo = str(tmp_path / 'duplicatas.json')
+    indice = IndiceDuplicatas(arquivo=arquivo)
+    indice.verificar_e_registrar(gerar_impressao("Fone https://shopee.com.br/a-i.111.222", 'banner'))
+    indice.salvar()
+    reiniciado = IndiceDuplicatas(arquivo=arquivo)
+    assert not reiniciado.verificar_e_registrar(gerar_impressao("Mouse https://shopee.com.br/b-i.333.444", 'banner'))
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Propagação de edições: em álbuns só a parte que leva a legenda altera a legenda no destino
+"""
+
+import asyncio
+
+import bot_cupons
+from benchmark_replay import MensagemFalsa
+from bot_cupons import SUB_IDS_PADRAO, Destino
+from envio_telegram import AgendadorEnvio
+from mapeamento_mensagens import MapeamentoMensagens
+
+def test_edicao_de_parte_sem_legenda_nao_apaga_a_legenda(tmp_path):
+    edicoes = []
+    class Enviada:
+        def __init__(self, msg_id):
+            self.id = msg_id
+    class Cliente:
+        async def send_file(self, canal, midia, caption=''):
+            return [Enviada(100 + i) for i in range(len(midia))]
+        async def edit_message(self, canal, msg_id, texto):
+            edicoes.append((canal, msg_id, texto))
+
+    async def executar():
+        app = bot_cupons.criar_aplicacao('', sessao=None, ouvir=False)
+        app.config.destinos = [Destino('a', '@a', [], [], {}, SUB_IDS_PADRAO)]
+        app.client, app.agendador_envio = Cliente(), AgendadorEnvio(max_por_minuto=0)
+        app.fila_persistente = None
+        app.mapeamento = MapeamentoMensagens(str(tmp_path / 'mapeamento.db'))
+        album = [MensagemFalsa(1, "Legenda da oferta"), MensagemFalsa(2, '')]
+        try:
+            await bot_cupons.enviar_envios(-1, bot_cupons.textos_por_parte(album), [None, None],
+                                           [('@a', "Legenda da oferta", SUB_IDS_PADRAO, {})])
+            # Parte sem legenda editada (o texto continua vazio): nada muda no destino
+            await bot_cupons.propagar_edicao(-1, 2, '')
+            await bot_cupons.propagar_edicao(-1, 1, "Legenda nova")
+        finally:
+            await app.agendador_envio.parar()
+            app.mapeamento.fechar()
+    asyncio.run(executar())
+    assert edicoes == [('@a', 100, "Legenda nova")]
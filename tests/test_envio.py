@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Envio pelo pipeline: um FloodWait pausa só o destino que o recebeu
+"""
+
+import asyncio
+import time
+
+from telethon import errors
+
+import bot_cupons
+from benchmark_replay import MensagemFalsa
+from bot_cupons import SUB_IDS_PADRAO, Destino
+from envio_telegram import AgendadorEnvio
+
+def test_flood_wait_em_um_destino_nao_segura_os_outros():
+    enviadas = []
+
+    async def executar():
+        app = bot_cupons.criar_aplicacao('', sessao=None, ouvir=False)
+        destinos = [Destino('a', '@a', [], [], {}, SUB_IDS_PADRAO), Destino('b', '@b', [], [], {}, SUB_IDS_PADRAO)]
+        app.config.destinos = destinos
+        app.agendador_envio = AgendadorEnvio(max_por_minuto=0)
+        app.fila_persistente = app.mapeamento = app.indice_duplicatas = None
+        inicio = time.monotonic()
+        bloqueado = [True]
+        class Cliente:
+            async def send_message(self, canal, texto, **kwargs):
+                if canal == '@a' and bloqueado[0]:
+                    bloqueado[0] = False
+                    # Pausa de ~1 s na fila de @a
+                    raise errors.FloodWaitError(request=None, capture=0)
+                enviadas.append((canal, texto, time.monotonic() - inicio))
+        app.client = Cliente()
+        await app.pipeline.iniciar()
+        try:
+            for msg_id in (1, 2):
+                await bot_cupons.entrar_no_pipeline(-1, MensagemFalsa(msg_id, f"Oferta {msg_id}"), destinos)
+            await bot_cupons.entrar_no_pipeline(-2, MensagemFalsa(1, "Outro canal"), destinos[1:])
+            while len(enviadas) < 5:
+                await asyncio.sleep(0.01)
+        finally:
+            await bot_cupons.parar_pipeline()
+            await app.agendador_envio.parar()
+    asyncio.run(executar())
+    para_b = [(texto, instante) for canal, texto, instante in enviadas if canal == '@b']
+    para_a = [texto for canal, texto, _ in enviadas if canal == '@a']
+    # Ordem mantida por canal de origem; canais diferentes não esperam um pelo outro
+    assert [texto for texto, _ in para_b if texto.startswith("Oferta")] == ["Oferta 1", "Oferta 2"]
+    assert len(para_b) == 3
+    assert all(instante < 0.5 for _, instante in para_b)
+    assert para_a == ["Oferta 1", "Oferta 2"]
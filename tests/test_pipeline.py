@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline de mensagens: ordem por canal e reinício com mensagens em andamento
+"""
+
+import asyncio
+
+from pipeline import PipelineMensagens
+
+def test_reinicio_durante_conversao_nao_trava_o_canal():
+    enviadas = []
+
+    async def processar(mensagem):
+        if mensagem == 'lenta':
+            await asyncio.sleep(60)
+        return mensagem
+
+    async def enviar(mensagem, resultado):
+        enviadas.append(mensagem)
+
+    async def executar():
+        pipeline = PipelineMensagens(processar, enviar, workers=2, tamanho_fila=10)
+        await pipeline.iniciar()
+        await pipeline.receber(-1, 'lenta')
+        await asyncio.sleep(0.01)
+        # Reconexão com a mensagem lenta ainda no worker
+        await pipeline.parar()
+        await pipeline.iniciar()
+        await pipeline.receber(-1, 'a')
+        await pipeline.receber(-1, 'b')
+        for _ in range(100):
+            if len(enviadas) == 2:
+                break
+            await asyncio.sleep(0.01)
+        metricas = pipeline.metricas()
+        await pipeline.parar()
+        return metricas
+
+    metricas = asyncio.run(executar())
+    assert enviadas == ['a', 'b']
+    assert metricas['aguardando_ordem'] == 0
+
+def test_ordem_por_canal_com_workers_fora_de_ordem():
+    enviadas = []
+
+    async def processar(mensagem):
+        canal, atraso = mensagem
+        await asyncio.sleep(atraso)
+        return mensagem
+
+    async def enviar(mensagem, resultado):
+        enviadas.append(mensagem)
+
+    async def executar():
+        pipeline = PipelineMensagens(processar, enviar, workers=4, tamanho_fila=10)
+        await pipeline.iniciar()
+        for mensagem in [(-1, 0.05), (-1, 0.0), (-2, 0.02), (-1, 0.01)]:
+            await pipeline.receber(mensagem[0], mensagem)
+        for _ in range(100):
+            if len(enviadas) == 4:
+                break
+            await asyncio.sleep(0.01)
+        await pipeline.parar()
+
+    asyncio.run(executar())
+    assert [m for m in enviadas if m[0] == -1] == [(-1, 0.05), (-1, 0.0), (-1, 0.01)]
+
+def test_envio_parado_segura_a_entrada():
+    liberar = None
+
+    async def processar(mensagem):
+        return mensagem
+
+    async def enviar(mensagem, resultado):
+        await liberar.wait()
+
+    async def executar():
+        nonlocal liberar
+        liberar = asyncio.Event()
+        pipeline = PipelineMensagens(processar, enviar, workers=2, tamanho_fila=2)
+        await pipeline.iniciar()
+        entrada = asyncio.ensure_future(asyncio.gather(*(pipeline.receber(-1, i) for i in range(52))))
+        await asyncio.sleep(0.1)
+        metricas = pipeline.metricas()
+        liberar.set()
+        await asyncio.wait_for(entrada, 5)
+        await pipeline.parar()
+        return metricas
+
+    metricas = asyncio.run(executar())
+    # Com o envio parado, a entrada espera: as filas não passam do limite
+    assert metricas['fila_envio'] <= 2 and metricas['fila_entrada'] <= 2
+    assert metricas['esperas_backpressure'] > 0
+    assert metricas['fila_envio'] + metricas['aguardando_ordem'] + metricas['envios_em_andamento'] < 10
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Recarga das regras a partir do .env
+"""
+
+import asyncio
+import os
+
+import pytest
+
+import bot_cupons
+
+@pytest.fixture
+def ambiente():
+    antes = dict(os.environ)
+    yield
+    os.environ.clear()
+    os.environ.update(antes)
+
+def test_linhas_apagadas_deixam_de_valer(tmp_path, ambiente):
+    arquivo = tmp_path / '.env'
+    arquivo.write_text("PALAVRAS_BLOQUEADAS=celular\nDESTINOS=a\nDESTINO_A_CANAL=@a\nDESTINO_A_PALAVRAS_CHAVE=ps5\n")
+
+    async def executar():
+        app = bot_cupons.criar_aplicacao(str(arquivo), sessao=None, ouvir=False)
+        assert app.config.destinos[0].palavras_bloqueadas == ['celular']
+        assert app.config.destinos[0].palavras_chave == ['ps5']
+        arquivo.write_text("DESTINOS=a\nDESTINO_A_CANAL=@a\n")
+        assert app.recarregar_regras()
+        return app.config.destinos[0]
+    destino = asyncio.run(executar())
+    assert destino.palavras_bloqueadas == [] and destino.palavras_chave == []
+    assert destino.filtro.analisar("celular novo") == (False, False)
+    assert 'PALAVRAS_BLOQUEADAS' not in os.environ
+
+def test_linha_apagada_volta_ao_valor_do_ambiente(tmp_path, ambiente):
+    os.environ['PALAVRAS_CHAVE'] = 'oferta'
+    arquivo = tmp_path / '.env'
+    arquivo.write_text("PALAVRAS_CHAVE=ps5\n")
+
+    async def executar():
+        app = bot_cupons.criar_aplicacao(str(arquivo), sessao=None, ouvir=False)
+        arquivo.write_text("PALAVRAS_CHAVE=xbox\n")
+        app.recarregar_regras()
+        assert app.config.palavras_chave == ['xbox']
+        arquivo.write_text("")
+        app.recarregar_regras()
+        return app.config.palavras_chave
+    assert asyncio.run(executar()) == ['oferta']
+
+def test_arquivo_prevalece_sobre_o_ambiente_ao_iniciar_e_ao_recarregar(tmp_path, ambiente):
+    os.environ['PALAVRAS_CHAVE'] = 'oferta'
+    arquivo = tmp_path / '.env'
+    arquivo.write_text("PALAVRAS_CHAVE=ps5\n")
+
+    async def executar():
+        app = bot_cupons.criar_aplicacao(str(arquivo), sessao=None, ouvir=False)
+        inicial = app.config.palavras_chave
+        # Recarga sem mudança no arquivo (SIGHUP ou touch) mantém o mesmo valor
+        app.recarregar_regras()
+        return inicial, app.config.palavras_chave
+    assert asyncio.run(executar()) == (['ps5'], ['ps5'])
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Recuperação de pendentes: uma mensagem ainda em andamento não é entregue de novo
+"""
+
+import asyncio
+
+import bot_cupons
+import supervisor
+from benchmark_replay import MensagemFalsa
+from bot_cupons import SUB_IDS_PADRAO, Destino
+
+def montar(recebidas):
+    class Pipeline:
+        async def receber(self, canal, item):
+            recebidas.append(item[1].id)
+        async def parar(self):
+            pass
+    app = bot_cupons.criar_aplicacao('', sessao=None, ouvir=False)
+    app.config.destinos = [Destino('a', '@a', [], [], {}, SUB_IDS_PADRAO)]
+    app.pipeline, app.fila_persistente, app.indice_duplicatas = Pipeline(), None, None
+    return app
+
+def test_recuperacao_nao_reentrega_mensagem_em_andamento():
+    recebidas = []
+
+    async def executar():
+        montar(recebidas)
+        mensagem = MensagemFalsa(1, "Oferta")
+        await bot_cupons.receber_mensagem(-1, mensagem)
+        # Ainda no pipeline (ou adiada): a recuperação não entrega de novo
+        await bot_cupons.receber_mensagem(-1, mensagem, recuperando=True)
+        bot_cupons.concluir_mensagem(-1, mensagem)
+        await bot_cupons.receber_mensagem(-1, mensagem, recuperando=True)
+    asyncio.run(executar())
+    assert recebidas == [1, 1]
+
+def test_reinicio_descarta_adiadas_e_libera_a_recuperacao():
+    recebidas = []
+
+    async def executar():
+        app = montar(recebidas)
+        mensagem = MensagemFalsa(1, "Oferta")
+        await bot_cupons.receber_mensagem(-1, mensagem)
+        app.fila_reprocessamento.agendar(lambda *_: asyncio.sleep(0), mensagem, 0)
+        await bot_cupons.parar_pipeline()
+        assert app.fila_reprocessamento.pendentes == 0
+        await bot_cupons.receber_mensagem(-1, mensagem, recuperando=True)
+    asyncio.run(executar())
+    assert recebidas == [1, 1]
+
+def test_supervisor_ignora_reentrega_de_ouvinte_reiniciado():
+    recebidas = []
+
+    async def executar():
+        montar(recebidas)
+        mensagem = bot_cupons.copiar_mensagem(MensagemFalsa(1, "Oferta"))
+        await supervisor.receber_repassada(-1, mensagem, ['@a'])
+        await supervisor.receber_repassada(-1, mensagem, ['@a'])
+    asyncio.run(executar())
+    assert recebidas == [1]
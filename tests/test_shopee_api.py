@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Retry, limitador, circuit breaker e adiamento de mensagens contra a Shopee falsa local
+"""
+
+import asyncio
+import time
+
+import bot_cupons
+from benchmark_bot import criar_api
+from benchmark_replay import MensagemFalsa
+from bot_cupons import AgrupadorLinks, FilaReprocessamento, fechar_sessao_http
+from envio_telegram import AgendadorEnvio
+from limitador import DisjuntorCircuito, LimitadorTaxa
+
+URL = "https://shopee.com.br/produto-1-i.1000.2000"
+URL_INVALIDA = "https://shopee.com.br/invalido-i.1.2"
+
+def converter(api, urls, temporarias=None):
+    async def executar():
+        try:
+            return await api.gen_links(urls, temporarias=temporarias)
+        finally:
+            await fechar_sessao_http()
+    return asyncio.run(executar())
+
+def test_429_e_retentado(servidor):
+    servidor.roteiro = ['429', '429']
+    limitador = LimitadorTaxa(taxa=1000, rajada=1000, taxa_max=1000)
+    api = criar_api(servidor, limitador=limitador, max_tentativas=3, atraso_base=0.01)
+    links = converter(api, [URL])
+    assert links[0] and links[0].startswith("https://s.shopee.com.br/af")
+    assert servidor.requisicoes == 3
+    assert limitador.throttlings == 2
+
+def test_erro_10030_e_retentado(servidor):
+    servidor.roteiro = ['10030']
+    limitador = LimitadorTaxa(taxa=1000, rajada=1000, taxa_max=1000)
+    api = criar_api(servidor, limitador=limitador, max_tentativas=3, atraso_base=0.01)
+    assert converter(api, [URL])[0]
+    assert servidor.requisicoes == 2
+    assert limitador.throttlings == 1
+
+def test_retry_after_pausa_o_limitador(servidor):
+    servidor.roteiro, servidor.retry_after = ['429'], 0.5
+    api = criar_api(servidor, max_tentativas=2, atraso_base=0.0)
+    inicio = time.monotonic()
+    assert converter(api, [URL])[0]
+    assert time.monotonic() - inicio >= 0.5
+
+def test_disjuntor_abre_apos_limiar_de_falhas(servidor):
+    servidor.roteiro = ['500'] * 10
+    disjuntor = DisjuntorCircuito(limiar_falhas=3, tempo_recuperacao=60)
+    api = criar_api(servidor, disjuntor=disjuntor, max_tentativas=10, atraso_base=0.0)
+    temporarias: set[str] = set()
+    assert converter(api, [URL], temporarias) == [None]
+    assert disjuntor.estado == DisjuntorCircuito.ABERTO
+    assert servidor.requisicoes == 3
+    assert temporarias == {URL}
+
+def test_erro_definitivo_nao_e_retentado(servidor):
+    api = criar_api(servidor, max_tentativas=3, atraso_base=0.0)
+    temporarias: set[str] = set()
+    links = converter(api, [URL, URL_INVALIDA], temporarias)
+    assert links[0] and links[1] is None
+    assert servidor.requisicoes == 1
+    assert not temporarias
+
+def montar_bot(api):
+    """Bot com a Shopee falsa e um cliente do Telegram que só registra os envios (chamar dentro do loop)."""
+    app = bot_cupons.criar_aplicacao('', sessao=None, ouvir=False)
+    app.shopee_api = api
+    app.agrupador_links = AgrupadorLinks(api, 0.01, 20)
+    app.fila_reprocessamento = FilaReprocessamento(max_tentativas=3, atraso_base=0.05)
+    app.agendador_envio = AgendadorEnvio(max_por_minuto=0)
+    app.fila_persistente = app.mapeamento = None
+    enviadas: list[tuple[str, str]] = []
+    class Cliente:
+        async def send_message(self, canal, texto, **kwargs):
+            enviadas.append((canal, texto))
+    app.client = Cliente()
+    return app, enviadas
+
+def test_mensagem_com_falha_temporaria_e_adiada(servidor):
+    servidor.roteiro = ['429']
+    enviadas = []
+
+    async def executar():
+        app, registradas = montar_bot(criar_api(servidor, max_tentativas=1, atraso_base=0.0))
+        item = (-100, MensagemFalsa(1, f"Oferta {URL}"), app.config.destinos)
+        try:
+            assert await bot_cupons.converter_mensagem(item) is None
+            assert app.fila_reprocessamento.pendentes == 1
+            while app.fila_reprocessamento.pendentes:
+                await asyncio.sleep(0.01)
+            enviadas.extend(registradas)
+        finally:
+            await app.agendador_envio.parar()
+            await fechar_sessao_http()
+    asyncio.run(executar())
+    assert len(enviadas) == 1
+    assert "s.shopee.com.br/af" in enviadas[0][1] and URL not in enviadas[0][1]
+
+def test_mensagem_com_link_invalido_nao_e_adiada(servidor):
+    async def executar():
+        app, _ = montar_bot(criar_api(servidor, max_tentativas=3, atraso_base=0.0))
+        item = (-100, MensagemFalsa(1, f"Oferta {URL} e {URL_INVALIDA}"), app.config.destinos)
+        try:
+            resultados = await bot_cupons.converter_mensagem(item)
+            assert app.fila_reprocessamento.pendentes == 0
+            return resultados
+        finally:
+            await fechar_sessao_http()
+    resultados = asyncio.run(executar())
+    assert resultados is not None
+    _, texto, _ = resultados[0]
+    assert URL_INVALIDA in texto and URL not in texto
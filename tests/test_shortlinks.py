@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Expansão de shortlinks: só resultados válidos ficam no cache
+"""
+
+import asyncio
+
+import bot_cupons
+from bot_cupons import expandir_shortlink, fechar_sessao_http
+
+def expandir(link):
+    async def executar():
+        try:
+            return await expandir_shortlink(link)
+        finally:
+            await fechar_sessao_http()
+    return asyncio.run(executar())
+
+def test_erro_do_servidor_nao_fica_no_cache(servidor, monkeypatch):
+    monkeypatch.setenv('CACHE_LINKS_ARQUIVO', '')
+    bot_cupons.criar_conversor('')
+    link = f"{servidor.base_url}/s/42"
+    servidor.roteiro = ['503']
+    assert expandir(link) == link
+    # A próxima chamada vai ao servidor de novo e agora segue os redirects
+    assert expandir(link) == f"{servidor.base_url}/produto/oferta-i.42.1"
+    requisicoes = servidor.requisicoes
+    assert expandir(link) == f"{servidor.base_url}/produto/oferta-i.42.1"
+    assert servidor.requisicoes == requisicoes
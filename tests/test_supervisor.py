@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Modo supervisor: os ouvintes só repassam a mensagem e o supervisor converte com um único limitador
+"""
+
+import asyncio
+import pickle
+import queue
+
+import bot_cupons
+import supervisor
+from benchmark_replay import MensagemFalsa
+from bot_cupons import SUB_IDS_PADRAO, Destino
+from deduplicacao import IndiceDuplicatas
+
+URL = "https://shopee.com.br/produto-1-i.1000.2000"
+
+def test_ouvinte_repassa_sem_converter():
+    saida = queue.Queue()
+
+    async def executar():
+        app = bot_cupons.criar_aplicacao('', sessao=None, ouvir=False)
+        app.config.destinos = [Destino('a', '@a', [], [], {}, SUB_IDS_PADRAO)]
+        app.saida, app.fila_persistente = saida, None
+        await bot_cupons.receber_mensagem(-1, MensagemFalsa(7, f"Oferta {URL}"))
+    asyncio.run(executar())
+    tipo, chat_id, mensagem, canais = saida.get_nowait()
+    # Vai para outro processo: precisa sobreviver ao pickle e manter o texto original
+    mensagem = pickle.loads(pickle.dumps(mensagem))
+    assert (tipo, chat_id, canais) == ('mensagem', -1, ['@a'])
+    assert mensagem.id == 7 and bot_cupons.obter_texto(mensagem) == f"Oferta {URL}"
+
+def test_supervisor_descarta_duplicata_entre_ouvintes():
+    recebidas = []
+    class Pipeline:
+        async def receber(self, canal, item):
+            recebidas.append((canal, [d.nome for d in item[2]]))
+
+    async def executar():
+        app = bot_cupons.criar_aplicacao('', sessao=None, ouvir=False)
+        app.config.destinos = [Destino('a', '@a', [], [], {}, SUB_IDS_PADRAO),
+                               Destino('b', '@b', [], [], {}, SUB_IDS_PADRAO)]
+        app.indice_duplicatas = IndiceDuplicatas()
+        app.pipeline, app.fila_persistente = Pipeline(), None
+        mensagem = bot_cupons.copiar_mensagem(MensagemFalsa(1, f"Oferta {URL}"))
+        await supervisor.receber_repassada(-1, mensagem, ['@a'])
+        # Mesma oferta vinda de outro ouvinte: só segue para o destino que ainda não a recebeu
+        await supervisor.receber_repassada(-2, mensagem._replace(id=2), ['@a', '@b'])
+    asyncio.run(executar())
+    assert recebidas == [(-1, ['a']), (-2, ['b'])]